@@ -18,20 +18,24 @@ NODE_DISPLAY_NAME_MAPPINGS = {}
 successful_modules = []
 failed_modules = []
 
+# 每个节点名来自哪个模块，用于发现重名
+node_sources = {}
+
 # 自动导入当前目录下的所有.py文件
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 print(f"{COLOR_BLUE}[img8]{COLOR_RESET} 开始加载自定义节点...")
 
 # 按文件名排序，确保加载顺序一致
+# 以下划线开头的文件是节点共用的内部模块（如 _img8ops.py），不作为节点加载
 for filename in sorted(os.listdir(current_dir)):
-    if filename.endswith('.py') and filename != '__init__.py':
+    if filename.endswith('.py') and filename != '__init__.py' and not filename.startswith('_'):
         module_name = filename[:-3]  # 去掉.py后缀
         module_path = os.path.join(current_dir, filename)
         
         try:
-            # 动态导入模块
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
+            # 动态导入模块（作为本包的子模块，节点文件可以用 from ._img8ops import ... 相对导入）
+            spec = importlib.util.spec_from_file_location(f"{__name__}.{module_name}", module_path)
             if spec is None:
                 error_msg = f"无法创建模块规范"
                 print(f"{COLOR_BLUE}[img8]{COLOR_RED} ❌ {module_name}: {error_msg}{COLOR_RESET}")
@@ -39,6 +43,7 @@ for filename in sorted(os.listdir(current_dir)):
                 continue
                 
             module = importlib.util.module_from_spec(spec)
+            sys.modules[spec.name] = module
             sys.modules[f"img8.{module_name}"] = module
             
             # 执行模块
@@ -46,12 +51,22 @@ for filename in sorted(os.listdir(current_dir)):
             
             # 收集节点映射
             node_count = 0
+            duplicates = set()
             if hasattr(module, 'NODE_CLASS_MAPPINGS'):
                 node_count = len(module.NODE_CLASS_MAPPINGS)
-                NODE_CLASS_MAPPINGS.update(module.NODE_CLASS_MAPPINGS)
+                # 重名的节点保留先加载的那个，并给出警告，避免后加载的文件悄悄覆盖
+                for key, node_class in module.NODE_CLASS_MAPPINGS.items():
+                    if key in node_sources:
+                        duplicates.add(key)
+                        print(f"{COLOR_BLUE}[img8]{COLOR_YELLOW} ⚠️ {module_name}: 节点 {key} 与 {node_sources[key]} 重名，已忽略{COLOR_RESET}")
+                        continue
+                    node_sources[key] = module_name
+                    NODE_CLASS_MAPPINGS[key] = node_class
                 
             if hasattr(module, 'NODE_DISPLAY_NAME_MAPPINGS'):
-                NODE_DISPLAY_NAME_MAPPINGS.update(module.NODE_DISPLAY_NAME_MAPPINGS)
+                NODE_DISPLAY_NAME_MAPPINGS.update(
+                    {k: v for k, v in module.NODE_DISPLAY_NAME_MAPPINGS.items() if k not in duplicates}
+                )
             
             if node_count > 0:
                 # 静默成功，不打印信息
@@ -0,0 +1,220 @@
+# img8 内部模块：从 zip / tar 数据集归档中直接读取图片
+# 路径写作 "归档路径::成员路径"，如 D:/data/shard-000.tar::images/0001.jpg，不需要先把归档解压到磁盘
+# tar 第一次用到时扫描一遍，把每个成员的 (数据偏移, 大小) 写入持久索引，之后任意成员都直接 seek 读取；
+# zip 自带中央目录，打开一次后常驻内存，按名字直接读取
+# 本模块的 exists / stat_key / decode_key / read_source 对普通文件路径同样适用
+import fnmatch
+import glob
+import hashlib
+import io
+import json
+import os
+import posixpath
+import tarfile
+import threading
+import zipfile
+from . import _img8cache as img8cache
+
+SEPARATOR = "::"
+TAR_EXTENSIONS = (".tar",)  # 只支持未压缩的 tar，压缩过的 tar 无法按偏移随机读取
+ZIP_EXTENSIONS = (".zip",)
+INDEX_DIRNAME = "img8_archive_index"
+
+
+def is_archive(path):
+    """path 是否为支持的归档文件"""
+    return path.lower().endswith(TAR_EXTENSIONS + ZIP_EXTENSIONS) and os.path.isfile(path)
+
+
+def split_path(path):
+    """把 "归档::成员" 拆成 (归档绝对路径, 成员路径)；不是归档路径时返回 (None, path)"""
+    archive, sep, member = path.partition(SEPARATOR)
+    if not sep or not archive.lower().endswith(TAR_EXTENSIONS + ZIP_EXTENSIONS):
+        return None, path
+    return os.path.abspath(archive), _member_name(member)
+
+
+def join_path(archive, member):
+    return f"{os.path.abspath(archive)}{SEPARATOR}{member}"
+
+
+def normalize(path):
+    """普通路径转为绝对路径，归档路径统一为 "归档绝对路径::成员" 的形式"""
+    archive, member = split_path(path)
+    if archive is None:
+        return os.path.abspath(path)
+    return join_path(archive, member)
+
+
+def _member_name(name):
+    name = name.replace("\\", "/")
+    while name.startswith("./"):
+        name = name[2:]
+    return name.lstrip("/")
+
+
+def index_file(archive):
+    """tar 成员索引的保存位置：与文件指纹索引同目录下的 img8_archive_index 文件夹"""
+    name = hashlib.sha1(archive.encode("utf-8")).hexdigest()[:16] + ".json"
+    return os.path.join(os.path.dirname(img8cache.index_path()), INDEX_DIRNAME, name)
+
+
+class ArchiveIndex:
+    """
+    已打开归档的成员表：tar 为 {成员: (数据偏移, 大小)}，zip 为常驻的 ZipFile 和 {成员: ZipInfo}；
+    成员名都经过 _member_name 统一（去掉 "./"、开头的 "/"，反斜杠转为 "/"）；归档变化后重建
+    """
+
+    def __init__(self):
+        self.tars = {}  # 归档路径 -> (快速指纹, {成员: [偏移, 大小]})
+        self.zips = {}  # 归档路径 -> (快速指纹, ZipFile, {成员: ZipInfo})
+        self.lock = threading.Lock()
+
+    def _tar_members(self, archive):
+        key = img8cache.stat_key(archive)
+        with self.lock:
+            entry = self.tars.get(archive)
+            if entry is None or entry[0] != key:
+                entry = (key, self._load_tar_index(archive, key))
+                self.tars[archive] = entry
+        return entry[1]
+
+    def _load_tar_index(self, archive, key):
+        path = index_file(archive)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("archive") == archive and data.get("key") == key:
+                return data["members"]
+        except (OSError, ValueError, AttributeError, KeyError):
+            pass  # 索引不存在、已过期或已损坏，重新扫描
+
+        print(f"🗂️ [img8] 正在为归档建立索引: {archive}")
+        members = {}
+        with tarfile.open(archive, "r:") as tar:
+            for info in tar:
+                if info.isreg() and not info.issparse():
+                    members[_member_name(info.name)] = [info.offset_data, info.size]
+        try:
+            img8cache.atomic_write_json(path, {"archive": archive, "key": key, "members": members})
+        except OSError as e:
+            print(f"[img8] ⚠️ 无法保存归档索引 {path}: {e}")
+        return members
+
+    def _zip_file(self, archive):
+        """返回 (ZipFile, {统一后的成员名: ZipInfo})"""
+        key = img8cache.stat_key(archive)
+        with self.lock:
+            entry = self.zips.get(archive)
+            if entry is None or entry[0] != key:
+                if entry is not None:
+                    entry[1].close()
+                zf = zipfile.ZipFile(archive, "r")
+                infos = {_member_name(info.filename): info for info in zf.infolist() if not info.is_dir()}
+                entry = (key, zf, infos)
+                self.zips[archive] = entry
+        return entry[1], entry[2]
+
+    def members(self, archive):
+        """归档中所有文件成员的名字"""
+        if archive.lower().endswith(ZIP_EXTENSIONS):
+            return list(self._zip_file(archive)[1])
+        return list(self._tar_members(archive))
+
+    def contains(self, archive, member):
+        if archive.lower().endswith(ZIP_EXTENSIONS):
+            return member in self._zip_file(archive)[1]
+        return member in self._tar_members(archive)
+
+    def read(self, archive, member):
+        """读取成员的全部字节"""
+        if archive.lower().endswith(ZIP_EXTENSIONS):
+            zf, infos = self._zip_file(archive)
+            info = infos.get(member)
+            if info is None:
+                raise FileNotFoundError(f"归档中没有该文件: {join_path(archive, member)}")
+            return zf.read(info)
+        entry = self._tar_members(archive).get(member)
+        if entry is None:
+            raise FileNotFoundError(f"归档中没有该文件: {join_path(archive, member)}")
+        offset, size = entry
+        with open(archive, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+
+# 全局共用的归档索引
+ARCHIVES = ArchiveIndex()
+
+
+def exists(path):
+    archive, member = split_path(path)
+    if archive is None:
+        return os.path.exists(path)
+    return os.path.isfile(archive) and ARCHIVES.contains(archive, member)
+
+
+def stat_key(path):
+    """快速指纹：普通文件同 img8cache.stat_key，归档成员为归档的快速指纹加成员名"""
+    archive, member = split_path(path)
+    if archive is None:
+        return img8cache.stat_key(path)
+    return img8cache.stat_key(archive) + [member]
+
+
+def decode_key(path):
+    """解码缓存的键：普通文件同 img8cache.decode_key，归档成员在归档的键后加成员名"""
+    archive, member = split_path(path)
+    if archive is None:
+        return img8cache.decode_key(path)
+    return img8cache.decode_key(archive) + (member,)
+
+
+def read_source(path):
+    """返回可交给 Image.open 的对象：普通文件为路径本身，归档成员为内存中的文件"""
+    archive, member = split_path(path)
+    if archive is None:
+        return path
+    return io.BytesIO(ARCHIVES.read(archive, member))
+
+
+def read_bytes(path):
+    """读取图片文件（或归档成员）的原始字节"""
+    archive, member = split_path(path)
+    if archive is None:
+        with open(path, "rb") as f:
+            return f.read()
+    return ARCHIVES.read(archive, member)
+
+
+def list_paths(entry):
+    """
+    展开归档条目为 "归档::成员" 路径列表（已排序）
+    entry 可以是归档本身（全部成员）、"归档::成员"、"归档::目录" 或 "归档::通配符"
+    """
+    archive, pattern = split_path(entry)
+    if archive is None:
+        archive, pattern = os.path.abspath(entry), ""
+    if not os.path.isfile(archive):
+        raise FileNotFoundError(f"归档不存在: {archive}")
+    names = ARCHIVES.members(archive)
+    if glob.has_magic(pattern):
+        names = [name for name in names if fnmatch.fnmatchcase(name, pattern)]
+    elif pattern and ARCHIVES.contains(archive, pattern):
+        names = [pattern]
+    elif pattern:
+        prefix = pattern.rstrip("/") + "/"
+        names = [name for name in names if name.startswith(prefix)]
+    return [join_path(archive, name) for name in sorted(names)]
+
+
+def sidecar_dir(path):
+    """
+    与图片配套的文本等文件的保存目录：普通文件为所在文件夹；
+    归档成员为归档旁边的 "<归档名>_captions" 文件夹，按成员的目录结构存放
+    """
+    archive, member = split_path(path)
+    if archive is None:
+        return os.path.dirname(path)
+    parts = [part for part in posixpath.dirname(member).split("/") if part not in ("", ".", "..")]
+    return os.path.join(os.path.splitext(archive)[0] + "_captions", *parts)
@@ -0,0 +1,188 @@
+# img8 内部模块：文件指纹与解码缓存
+# 先比较 (st_size, st_mtime_ns, st_ino)，只有这三项变化时才重新计算整个文件的 SHA-256
+# 计算过的指纹保存在一个小的 JSON 索引里，ComfyUI 重启后不必重新哈希整个数据集
+# 解码后的图片张量保存在按字节预算淘汰的 LRU 缓存里，同一文件重复加载时直接命中
+import atexit
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import folder_paths
+except ImportError:  # 不在 ComfyUI 中运行时没有 folder_paths，索引放在系统临时目录
+    folder_paths = None
+
+INDEX_FILENAME = "img8_fingerprints.json"
+HASH_CHUNK_SIZE = 1024 * 1024  # 分块读取，避免大文件一次读进内存
+MAX_ENTRIES = 50000            # 索引最多记录的文件数，超出时丢弃最久未用的
+SAVE_INTERVAL = 2.0            # 两次写盘之间至少间隔的秒数，其余的变化在退出时一起写入
+
+# 解码缓存的内存预算（MB），可用环境变量 IMG8_DECODE_CACHE_MB 设置，0 表示不缓存
+DECODE_CACHE_MB = int(os.environ.get("IMG8_DECODE_CACHE_MB", 1024))
+
+
+def index_path():
+    if folder_paths is not None and hasattr(folder_paths, "get_user_directory"):
+        return os.path.join(folder_paths.get_user_directory(), INDEX_FILENAME)
+    return os.path.join(tempfile.gettempdir(), INDEX_FILENAME)
+
+
+def stat_key(path):
+    """文件的快速指纹：(大小, 修改时间, inode)"""
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+def hash_file(path):
+    """分块计算整个文件的 SHA-256"""
+    m = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            m.update(chunk)
+    return m.hexdigest()
+
+
+def atomic_write_json(path, data):
+    """写到同目录的临时文件后再替换，写盘中途出错不会留下半个文件"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".img8_", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class FingerprintIndex:
+    """{绝对路径: [大小, 修改时间, inode, sha256]}，按最近使用的顺序保存"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = None
+        self.dirty = False
+        self.last_save = 0.0
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        self.path = self.path or index_path()
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.entries = {k: v for k, v in data.items() if isinstance(v, list) and len(v) == 4}
+        except (OSError, ValueError):
+            pass  # 索引不存在或已损坏，从空索引开始
+
+    def fingerprint(self, path):
+        """返回文件内容的 SHA-256；快速指纹没变时直接用索引里的结果，不读文件"""
+        path = os.path.abspath(path)
+        key = stat_key(path)
+        with self.lock:
+            self._load()
+            entry = self.entries.pop(path, None)
+            if entry is not None and entry[:3] == key:
+                self.entries[path] = entry  # 重新插入到末尾，记为最近使用
+                return entry[3]
+
+        digest = hash_file(path)
+        with self.lock:
+            self.entries[path] = key + [digest]
+            while len(self.entries) > MAX_ENTRIES:
+                self.entries.pop(next(iter(self.entries)))
+            self.dirty = True
+            if time.monotonic() - self.last_save >= SAVE_INTERVAL:
+                self._save()
+        return digest
+
+    def _save(self):
+        try:
+            atomic_write_json(self.path, self.entries)
+            self.dirty = False
+        except OSError as e:
+            print(f"[img8] ⚠️ 无法保存文件指纹索引 {self.path}: {e}")
+        self.last_save = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            if self.dirty:
+                self._save()
+
+
+# 全局共用的指纹索引，第一次用到时才读取索引文件，退出时写入未保存的变化
+FINGERPRINTS = FingerprintIndex()
+atexit.register(FINGERPRINTS.flush)
+
+
+def fingerprint(path):
+    return FINGERPRINTS.fingerprint(path)
+
+
+class LRUCache:
+    """按字节预算淘汰最久未用条目的 LRU 缓存，记录命中、未命中和淘汰次数"""
+
+    def __init__(self, max_bytes, sizeof=lambda value: value.nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.items = collections.OrderedDict()  # key -> (value, 字节数)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            if size > self.max_bytes:
+                return  # 单个条目就超出预算，不缓存
+            self.items[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.items.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            }
+
+
+# 全局共用的解码缓存，键为 (绝对路径, 文件大小, 修改时间)；缓存的张量被多次返回，调用方不能原地修改
+DECODE_CACHE = LRUCache(DECODE_CACHE_MB * 1024 * 1024)
+
+
+def decode_key(path):
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
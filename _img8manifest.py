@@ -0,0 +1,128 @@
+# img8 内部模块：反推结果清单
+# 用一个 SQLite 文件记录 (图片路径, 内容指纹, 模型键, 提示词键) -> 文本，主键带索引，十万张图也能直接查询
+# 反推中断后重新运行时，批量加载节点按清单跳过已经有匹配记录的图片，只处理缺少的部分
+# 图片内容变化（指纹不同）、换了模型或提示词时记录不再匹配，会重新反推
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from . import _img8archive as img8archive
+from . import _img8cache as img8cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captions (
+    path TEXT NOT NULL,
+    model_key TEXT NOT NULL,
+    prompt_key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    caption TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (path, model_key, prompt_key)
+)
+"""
+
+
+def manifest_path(name):
+    """清单文件路径：绝对路径原样使用，只给文件名时放在文件指纹索引的目录（ComfyUI 的 user 目录）"""
+    name = name.strip().strip('"')
+    if os.path.isabs(name):
+        return name
+    return os.path.join(os.path.dirname(img8cache.index_path()), name)
+
+
+def text_key(text):
+    """文本的短哈希，空文本为空字符串"""
+    text = (text or "").strip()
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] if text else ""
+
+
+def model_key(llama_model):
+    """
+    模型键：llama_cpp 模型加载节点输出的 LLAMACPPMODEL（只读取它的配置，不会因此加载模型）或配置字典，
+    按配置内容（模型、mmproj、chat_handler、上下文长度等）生成；未接入时为空字符串
+    """
+    if isinstance(llama_model, dict):
+        config = llama_model
+    else:
+        config = getattr(llama_model, "config", None) or getattr(llama_model, "current_config", None)
+    if not config:
+        return ""
+    return text_key(json.dumps(config, sort_keys=True, ensure_ascii=False))
+
+
+def prompt_key(prompt, system_prompt=""):
+    """提示词键：由接入 llama_cpp_instruct_adv 的同一个提示词和系统提示词生成，都为空时为空字符串"""
+    prompt, system_prompt = (prompt or "").strip(), (system_prompt or "").strip()
+    if not system_prompt:
+        return text_key(prompt)
+    return text_key(json.dumps([system_prompt, prompt], ensure_ascii=False))
+
+
+def content_key(path):
+    """图片内容指纹：普通文件用持久化的 SHA-256 索引，归档成员直接哈希成员内容"""
+    archive, member = img8archive.split_path(path)
+    if archive is None:
+        return img8cache.fingerprint(path)
+    return hashlib.sha256(img8archive.ARCHIVES.read(archive, member)).hexdigest()
+
+
+class Manifest:
+    """一个清单文件；连接在第一次使用时打开，多个线程共用，读写都加锁"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(SCHEMA)
+            self.conn.commit()
+        return self.conn
+
+    def record(self, entries):
+        """写入一批 (图片路径, 内容指纹, 模型键, 提示词键, 文本)，同一键的旧记录被替换"""
+        now = time.time()
+        rows = [(path, model_key, prompt_key, fingerprint, caption, now)
+                for path, fingerprint, model_key, prompt_key, caption in entries]
+        with self.lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO captions VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+
+    def lookup(self, path, model_key, prompt_key):
+        """返回 (内容指纹, 文本)，没有记录时返回 None"""
+        with self.lock:
+            return self._connect().execute(
+                "SELECT fingerprint, caption FROM captions WHERE path = ? AND model_key = ? AND prompt_key = ?",
+                (path, model_key, prompt_key),
+            ).fetchone()
+
+    def is_captioned(self, path, model_key, prompt_key):
+        """有记录且图片内容没变；没有记录的图片不计算指纹"""
+        row = self.lookup(path, model_key, prompt_key)
+        return row is not None and row[0] == content_key(path)
+
+    def pending(self, paths, model_key, prompt_key):
+        """paths 中还没有匹配记录的部分，保持顺序"""
+        return [path for path in paths if not self.is_captioned(path, model_key, prompt_key)]
+
+
+_MANIFESTS = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def open_manifest(name):
+    """按名字取得清单（同一文件共用一个对象），名字为空时返回 None 表示不使用清单"""
+    if not name or not name.strip():
+        return None
+    path = os.path.abspath(manifest_path(name))
+    with _MANIFESTS_LOCK:
+        if path not in _MANIFESTS:
+            _MANIFESTS[path] = Manifest(path)
+        return _MANIFESTS[path]
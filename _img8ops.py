@@ -0,0 +1,127 @@
+# img8 内部模块：几何节点共用的边缘填充、放置和遮罩整理内核
+# 以下划线开头的文件不是节点，__init__.py 不会把它当作节点加载
+import torch
+
+# 支持的边缘填充模式
+PAD_MODES = ("replicate", "reflect", "constant")
+
+
+def pad_index(size, before, after, mode, device=None):
+    """
+    计算一条边长为 size 的轴在两侧各扩展 before/after 个像素后，
+    每个输出位置对应的源索引（长度 before + size + after）
+    """
+    idx = torch.arange(-before, size + after, device=device)
+    if mode == "replicate":
+        return idx.clamp(0, size - 1)
+    if mode == "reflect":
+        if size == 1:
+            return torch.zeros_like(idx)
+        # 以边缘像素为轴镜像（不重复边缘），超出一个周期时继续往返镜像
+        period = 2 * (size - 1)
+        idx = idx.remainder(period)
+        return torch.where(idx >= size, period - idx, idx)
+    raise ValueError(f"不支持的填充模式: {mode}")
+
+
+def fill_border_(canvas, left, right, top, bottom, mode="replicate", value=0.0):
+    """
+    原地填充画布四周的边缘，内部区域 [top:H-bottom, left:W-right] 必须已经写好
+    canvas 形状为 [B, H, W, C] 或 [B, H, W]
+    """
+    height, width = canvas.shape[1], canvas.shape[2]
+    inner_h = height - top - bottom
+    inner_w = width - left - right
+
+    if mode == "constant":
+        if top:
+            canvas[:, :top] = value
+        if bottom:
+            canvas[:, top + inner_h:] = value
+        if left:
+            canvas[:, top:top + inner_h, :left] = value
+        if right:
+            canvas[:, top:top + inner_h, left + inner_w:] = value
+        return canvas
+
+    # 先填左右两侧（只处理内部行），再整行填充上下两侧（角落随之得到）
+    if left or right:
+        cols = pad_index(inner_w, left, right, mode, canvas.device) + left
+        rows_view = canvas[:, top:top + inner_h]
+        if left:
+            rows_view[:, :, :left] = rows_view[:, :, cols[:left]]
+        if right:
+            rows_view[:, :, left + inner_w:] = rows_view[:, :, cols[left + inner_w:]]
+    if top or bottom:
+        rows = pad_index(inner_h, top, bottom, mode, canvas.device) + top
+        if top:
+            canvas[:, :top] = canvas[:, rows[:top]]
+        if bottom:
+            canvas[:, top + inner_h:] = canvas[:, rows[top + inner_h:]]
+    return canvas
+
+
+def place(x, height, width, left, top, value=0.0):
+    """
+    把 x 放到 height×width 的画布上 (left, top) 处，超出画布的部分被裁掉
+    画布只分配一次，未覆盖的区域为 value
+    """
+    out = x.new_full((x.shape[0], height, width) + tuple(x.shape[3:]), value)
+    src_x0, src_y0 = max(0, -left), max(0, -top)
+    dst_x0, dst_y0 = max(0, left), max(0, top)
+    copy_w = min(x.shape[2] - src_x0, width - dst_x0)
+    copy_h = min(x.shape[1] - src_y0, height - dst_y0)
+    if copy_w > 0 and copy_h > 0:
+        out[:, dst_y0:dst_y0 + copy_h, dst_x0:dst_x0 + copy_w] = \
+            x[:, src_y0:src_y0 + copy_h, src_x0:src_x0 + copy_w]
+    return out
+
+
+def crop_box(orig_width, orig_height, target_width, target_height, position):
+    """
+    按位置计算裁剪区域，返回 (left, top, width, height)
+    position: up / left / down / right / middle；
+    宽度方向 up 视为 left、down 视为 right，高度方向 left 视为 up、right 视为 down
+    """
+    delta_width = orig_width - target_width
+    delta_height = orig_height - target_height
+
+    if delta_width > 0:
+        if position in ["left", "up"]:
+            left = 0
+        elif position in ["right", "down"]:
+            left = delta_width
+        else:  # middle
+            left = delta_width // 2
+        width = target_width
+    else:
+        left, width = 0, orig_width
+
+    if delta_height > 0:
+        if position in ["up", "left"]:
+            top = 0
+        elif position in ["down", "right"]:
+            top = delta_height
+        else:  # middle
+            top = delta_height // 2
+        height = target_height
+    else:
+        top, height = 0, orig_height
+
+    return left, top, width, height
+
+
+def as_mask_batch(mask, batch_size=None):
+    """把 [H, W] / [B, H, W] / [B, 1, H, W] 的遮罩统一为 [B, H, W]，单张遮罩按需广播"""
+    if mask.dim() == 2:
+        mask = mask.unsqueeze(0)
+    elif mask.dim() == 4 and mask.shape[1] == 1:
+        mask = mask[:, 0]
+    elif mask.dim() != 3:
+        raise ValueError(f"遮罩的维度无效: {tuple(mask.shape)}")
+    if batch_size is not None and mask.shape[0] != batch_size:
+        if mask.shape[0] == 1:
+            mask = mask.expand(batch_size, -1, -1)
+        else:
+            raise ValueError(f"遮罩批次({mask.shape[0]})与图像批次({batch_size})不一致")
+    return mask
@@ -0,0 +1,61 @@
+# img8 内部模块：对齐尺寸规划
+# 给定宽高比、对齐倍数和像素预算，返回不超过预算、宽高都是倍数的最大尺寸，宽高比失真最小
+# 例外：预算小于 multiple × multiple 时没有合法尺寸，返回最小的对齐尺寸 (multiple, multiple)，会超出预算
+# 各几何节点（img8x / img88 / img8sc / img8seedvr2WHtrans / img8plan）共用这里的取整和规划，得到的尺寸完全一致
+import bisect
+import functools
+import math
+
+# 表中收录的宽高比范围（1:16 到 16:1），超出范围的请求按边界处理
+ASPECT_LIMIT = 16.0
+
+
+def align_up(value, multiple):
+    """向上取整到 multiple 的倍数"""
+    return ((value + multiple - 1) // multiple) * multiple
+
+
+def align_nearest(value, multiple):
+    """取整到最接近的 multiple 的倍数，正好一半时向下"""
+    remainder = value % multiple
+    if remainder <= multiple // 2:
+        return value - remainder
+    return value + (multiple - remainder)
+
+
+@functools.lru_cache(maxsize=64)
+def size_table(multiple, max_pixels):
+    """
+    预先计算某个 (multiple, max_pixels) 下所有"最大"的对齐尺寸：再加宽或加高一个倍数都会超出预算
+    返回 (aspects, sizes)，按宽高比升序排列，aspects[i] = sizes[i][0] / sizes[i][1]
+    """
+    units = max_pixels // (multiple * multiple)  # 预算折算成 multiple×multiple 的块数
+    aspects, sizes = [], []
+    if units < 1:
+        # 预算连一个块都放不下，只能返回最小的对齐尺寸，此时结果超出预算
+        return (1.0,), ((multiple, multiple),)
+
+    # 宽度为 kw 块时最大的高度为 units // kw；只保留该高度下宽度也取到最大的点（预算阶梯的拐角）
+    kw_min = max(1, math.ceil(math.sqrt(units / ASPECT_LIMIT)))
+    kw_max = max(kw_min, math.floor(math.sqrt(units * ASPECT_LIMIT)))
+    for kw in range(kw_min, kw_max + 1):
+        kh = units // kw
+        if kh < 1:
+            break
+        if units // kh != kw:
+            continue
+        aspects.append(kw / kh)
+        sizes.append((kw * multiple, kh * multiple))
+    return tuple(aspects), tuple(sizes)
+
+
+def plan_size(aspect, multiple, max_pixels):
+    """
+    返回 (width, height)：宽高是 multiple 的倍数、像素数不超过 max_pixels 的最大尺寸中，
+    宽高比（按对数距离）最接近 aspect 的一个；失真相同时取面积更大的
+    max_pixels < multiple * multiple 时返回 (multiple, multiple)，这是唯一不满足预算的情况
+    """
+    aspects, sizes = size_table(multiple, max_pixels)
+    i = bisect.bisect_left(aspects, aspect)
+    candidates = sizes[max(0, i - 1):i + 1]
+    return min(candidates, key=lambda size: (abs(math.log(size[0] / size[1] / aspect)), -size[0] * size[1]))
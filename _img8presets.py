@@ -0,0 +1,149 @@
+# img8 内部模块：模型分辨率预设表
+# 预设写在 img8presets.json 里，导入时解析、校验一次，整理成 Preset 记录；节点每次调用只做字典查找
+# 用户可以在 ComfyUI 的 user 目录放一个同格式的 img8presets.json 追加或覆盖预设（同名标签覆盖），
+# 文件修改时间变化后下次查找时自动重新载入
+import collections
+import json
+import math
+import os
+
+try:
+    import folder_paths
+except ImportError:  # 不在 ComfyUI 中运行时没有 folder_paths，用户预设文件放在本目录
+    folder_paths = None
+
+BUILTIN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img8presets.json")
+PRESET_FILENAME = "img8presets.json"
+
+# 一条预设：family 为模型系列（flux / wan / qwen ...），label 为下拉框里显示的文字
+Preset = collections.namedtuple("Preset", "family label ratio width height note")
+
+
+def user_file():
+    """用户预设文件的路径，可用环境变量 IMG8_PRESETS 指定"""
+    if os.environ.get("IMG8_PRESETS"):
+        return os.environ["IMG8_PRESETS"]
+    if folder_paths is not None and hasattr(folder_paths, "get_user_directory"):
+        return os.path.join(folder_paths.get_user_directory(), PRESET_FILENAME)
+    return os.path.join(os.path.dirname(BUILTIN_FILE), "img8presets.user.json")
+
+
+def parse_presets(data, source):
+    """
+    校验并解析预设数据，返回 {family: (default_label, [Preset, ...])}
+    格式不对时抛出 ValueError，信息里带上来源文件
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"{source}: 顶层必须是对象")
+    families = {}
+    for family, entry in data.items():
+        presets = entry.get("presets") if isinstance(entry, dict) else None
+        if not isinstance(presets, list) or not presets:
+            raise ValueError(f"{source}: {family} 缺少 presets 列表")
+        records = []
+        for item in presets:
+            try:
+                width, height = int(item["width"]), int(item["height"])
+                label = str(item["label"])
+                divisor = math.gcd(width, height) or 1
+                ratio = str(item.get("ratio") or f"{width // divisor}:{height // divisor}")
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"{source}: {family} 中的预设格式无效: {item}")
+            if width <= 0 or height <= 0:
+                raise ValueError(f"{source}: {family}/{label} 的宽高必须为正数")
+            parts = ratio.split(":")
+            if len(parts) != 2 or not all(part.isdigit() for part in parts):
+                raise ValueError(f"{source}: {family}/{label} 的比例格式无效: {ratio}")
+            if any(record.label == label for record in records):
+                raise ValueError(f"{source}: {family} 中的标签重复: {label}")
+            records.append(Preset(family, label, ratio, width, height, str(item.get("note", ""))))
+        default = entry.get("default", records[0].label)
+        if not any(record.label == default for record in records):
+            raise ValueError(f"{source}: {family} 的默认值不在预设中: {default}")
+        families[family] = (default, records)
+    return families
+
+
+def load_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_presets(json.load(f), path)
+
+
+class PresetRegistry:
+    """内置预设加上用户预设，用户文件按修改时间判断是否需要重新载入"""
+
+    def __init__(self, builtin_file=BUILTIN_FILE):
+        self.builtin = load_file(builtin_file)
+        self.user_mtime = None
+        self.families = {}
+        self.by_key = {}
+        self._merge({})
+
+    def _merge(self, user):
+        families = {family: (default, list(records)) for family, (default, records) in self.builtin.items()}
+        for family, (default, records) in user.items():
+            if family not in families:
+                families[family] = (default, list(records))
+                continue
+            merged = families[family][1]
+            for record in records:
+                for i, old in enumerate(merged):
+                    if old.label == record.label:
+                        merged[i] = record
+                        break
+                else:
+                    merged.append(record)
+        self.families = families
+        self.by_key = {
+            (family, record.label): record for family, (_, records) in families.items() for record in records
+        }
+
+    def refresh(self):
+        """用户预设文件的修改时间变化时重新载入；文件有误时打印警告并只用内置预设"""
+        path = user_file()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.user_mtime:
+            return
+        self.user_mtime = mtime
+        user = {}
+        if mtime is not None:
+            try:
+                user = load_file(path)
+                print(f"[img8] 已载入用户预设: {path}")
+            except (OSError, ValueError) as e:
+                print(f"[img8] ⚠️ 用户预设文件无效，已忽略: {e}")
+        self._merge(user)
+
+    def labels(self, family):
+        self.refresh()
+        return [record.label for record in self.families[family][1]]
+
+    def default(self, family):
+        self.refresh()
+        return self.families[family][0]
+
+    def choices(self):
+        """所有预设的 "family/label" 列表，用于其他节点的 preset 下拉框"""
+        self.refresh()
+        return [f"{family}/{label}" for family, label in self.by_key]
+
+    def get(self, family, label):
+        """按 (family, label) 查找，找不到时返回该系列的默认预设"""
+        self.refresh()
+        record = self.by_key.get((family, label))
+        if record is None:
+            record = self.by_key[(family, self.families[family][0])]
+        return record
+
+    def lookup(self, choice):
+        """按 "family/label" 查找，用于 preset 下拉框的取值；"none" 或找不到时返回 None"""
+        family, _, label = choice.partition("/")
+        self.refresh()
+        return self.by_key.get((family, label))
+
+
+# 全局共用的预设表，导入时解析内置预设
+REGISTRY = PresetRegistry()
@@ -0,0 +1,363 @@
+# img8 内部模块：可插拔的缩放后端
+# 输入输出都是 [B, H, W, C] 图像或 [B, H, W] 遮罩，保持输入的 dtype 和设备，不经过 uint8 / PIL 往返
+#
+# 后端：
+#   torch - 与 PIL 相同的可分离滤波核（带抗锯齿），权重存成稀疏矩阵，两次稀疏矩阵乘完成缩放
+#   pil   - 参考实现，逐帧逐通道用 32 位浮点 "F" 模式缩放
+#
+# 分块模式：torch 后端可以按输出行分条处理，每条只读取用到的源行，结果直接写进调用方预分配的输出，
+# 临时内存不超过 max_bytes；逐元素的计算顺序与不分块时相同，输出像素完全一致
+#
+# 输出窗口：window=(left, top, width, height) 只计算整幅缩放结果中的一块，只读取这块用到的源像素，
+# 权重与整幅缩放相同，结果与"先整幅缩放再裁剪"逐像素一致（先裁后缩的 ROI 规划）
+#
+# 多核：CPU 上的多帧批次逐帧交给有界线程池并行处理。PIL 的 resize 和 torch 的稀疏矩阵乘都会释放 GIL，
+# 而 CPU 上的稀疏矩阵乘本身是单线程的，所以帧级并行能让吞吐量随核数增长。
+# torch 后端每帧的拷贝、转置仍会用满 torch 的 intra-op 线程，线程池只占用剩下的核，
+# 即 帧线程数 × torch.get_num_threads() 不超过核数，避免超额订阅（torch.set_num_threads 是进程级的，不能在工作线程里单独限制）
+# GPU 上不逐帧循环：整批帧并进矩阵的列，每条只做两次矩阵乘，即 [W_out, W_in] @ [W_in, B*行数*C]，
+# 垂直方向同理，一次 kernel 处理整批。CPU 上整批合并反而更慢（16x512x512 单线程实测 0.23 秒对 0.10 秒），
+# 仍然逐帧计算
+import functools
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from PIL import Image
+
+RESAMPLE_METHODS = ("nearest", "bilinear", "bicubic", "area", "lanczos")
+
+# 各后端的缩放函数：{(backend, method): fn(x, out, size, offset, max_bytes)}
+# x 为 [B, H, W, C] 源图像（任意 dtype），size=(height, width) 为整幅缩放尺寸，
+# 把其中从 offset=(top, left) 开始、与 out 同样大小的一块写入 [B, h, w, C] 的 out 并返回 out
+RESAMPLERS = {}
+
+# 逐帧并行的线程数上限，可用环境变量 IMG8_RESIZE_WORKERS 覆盖（1 表示不并行），无效值时使用默认值
+def _resize_workers():
+    default = min(32, os.cpu_count() or 1)
+    value = os.environ.get("IMG8_RESIZE_WORKERS", "").strip()
+    if not value:
+        return default
+    try:
+        workers = int(value)
+    except ValueError:
+        workers = -1
+    if workers < 0:
+        print(f"[img8] ⚠️ IMG8_RESIZE_WORKERS={value!r} 无效，使用默认值 {default}")
+        return default
+    return workers or default  # 0 同样表示使用默认值
+
+
+RESIZE_WORKERS = _resize_workers()
+
+# 默认后端。单线程 CPU 实测（float32 RGB，单位秒）：
+#   尺寸                      torch(lanczos)  pil(lanczos, F模式)  F.interpolate(bicubic, 抗锯齿)
+#   1024x1024 -> 512x512      0.043           0.052                0.029
+#   1024x1024 -> 2048x2048    0.211           0.317                0.168
+#   3840x2160 -> 1152x648     0.250           0.393                0.145
+#   6000x4000 -> 1248x832     0.746           0.780                0.363
+# torch 后端在各档尺寸上都不慢于 PIL，且可以整批、在 GPU 上运行；各滤波核耗时相近（3840x2160 -> 1152x648
+# 时 area/bilinear/bicubic/lanczos 为 0.28/0.29/0.23/0.27 秒，主要花在转置拷贝上）
+DEFAULT_BACKEND = "torch"
+
+# method="auto" 时按缩放比例（源边长/目标边长，取两轴较大者）选择滤波核：放大用 bicubic，缩小用 lanczos
+# 既然各滤波核耗时相近，缩小时直接用质量最好的 lanczos，避免 4K -> 1MP 这类大比例缩小出现混叠
+AUTO_METHODS = (
+    (1.0, "bicubic"),
+    (math.inf, "lanczos"),
+)
+
+
+def register_resampler(backend, method):
+    """注册某个后端的缩放实现"""
+    def decorator(fn):
+        RESAMPLERS[(backend, method)] = fn
+        return fn
+    return decorator
+
+
+def auto_method(src_height, src_width, height, width):
+    """按缩放比例选择默认的滤波核"""
+    ratio = max(src_height / height, src_width / width)
+    for max_ratio, method in AUTO_METHODS:
+        if ratio <= max_ratio:
+            return method
+    return AUTO_METHODS[-1][1]
+
+
+def compute_dtype(dtype):
+    """半精度等类型缺少稀疏矩阵乘等实现，计算时提升到 float32"""
+    return dtype if dtype in (torch.float32, torch.float64) else torch.float32
+
+
+# ---------------------------------------------------------------------------
+# 滤波核（与 PIL 的定义一致）：{method: (核函数, 支撑半径)}
+# ---------------------------------------------------------------------------
+
+def _box(x):
+    return ((x > -0.5) & (x <= 0.5)).to(x.dtype)
+
+
+def _triangle(x):
+    return (1.0 - x.abs()).clamp(min=0.0)
+
+
+def _cubic(x, a=-0.5):
+    x = x.abs()
+    near = ((a + 2.0) * x - (a + 3.0)) * x * x + 1.0
+    far = (((x - 5.0) * x + 8.0) * x - 4.0) * a
+    return torch.where(x < 1.0, near, torch.where(x < 2.0, far, torch.zeros_like(x)))
+
+
+def _lanczos(x, a=3.0):
+    return torch.where(x.abs() < a, torch.sinc(x) * torch.sinc(x / a), torch.zeros_like(x))
+
+
+FILTERS = {
+    "area": (_box, 0.5),
+    "bilinear": (_triangle, 1.0),
+    "bicubic": (_cubic, 2.0),
+    "lanczos": (_lanczos, 3.0),
+}
+
+
+@functools.lru_cache(maxsize=64)
+def axis_weights(in_size, out_size, method):
+    """
+    计算一条轴的缩放权重，返回 (idx, weight)，形状都是 [out_size, K]
+    输出像素 i 的值为 sum_k weight[i, k] * src[idx[i, k]]
+    采样中心与支撑范围的算法与 PIL 的 ImagingResample 相同，缩小时按比例放宽支撑实现抗锯齿
+    """
+    filter_fn, support = FILTERS[method]
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support = support * filterscale
+
+    centers = (torch.arange(out_size, dtype=torch.float64) + 0.5) * scale
+    xmin = torch.floor(centers - support + 0.5).clamp(min=0)
+    xmax = torch.floor(centers + support + 0.5).clamp(max=in_size)
+    taps = max(1, int((xmax - xmin).max()))
+
+    idx = xmin[:, None] + torch.arange(taps, dtype=torch.float64)
+    weight = filter_fn((idx - centers[:, None] + 0.5) / filterscale)
+    weight = torch.where(idx < xmax[:, None], weight, torch.zeros_like(weight))
+    weight = weight / weight.sum(dim=1, keepdim=True).clamp(min=1e-12)
+    return idx.clamp(max=in_size - 1).long(), weight
+
+
+def _sparse_weights(in_size, out_size, method, device, dtype, start=0, stop=None):
+    """
+    把一条轴上输出 [start, stop) 的权重组装成稀疏矩阵，返回 (matrix, src_start, src_stop)
+    矩阵形状为 [stop - start, src_stop - src_start]，只覆盖这段输出用到的源像素
+    """
+    idx, weight = axis_weights(in_size, out_size, method)
+    idx, weight = idx[start:stop], weight[start:stop]
+    src_start, src_stop = int(idx.min()), int(idx.max()) + 1
+    rows = torch.arange(idx.shape[0]).repeat_interleave(idx.shape[1])
+    matrix = torch.sparse_coo_tensor(
+        torch.stack((rows, (idx - src_start).flatten())), weight.flatten(),
+        (idx.shape[0], src_stop - src_start), check_invariants=False
+    ).coalesce()
+    return matrix.to(device=device, dtype=dtype), src_start, src_stop
+
+
+def _nearest_index(in_size, out_size, device):
+    """与 PIL NEAREST 相同的采样位置：floor((i + 0.5) * scale)"""
+    scale = in_size / out_size
+    idx = ((torch.arange(out_size, dtype=torch.float64) + 0.5) * scale).floor().long()
+    return idx.clamp(max=in_size - 1).to(device)
+
+
+def strip_rows(height, row_bytes, fixed_bytes=0, max_bytes=None):
+    """按内存预算计算每条处理多少输出行，至少一行；max_bytes 为空时整帧一次处理"""
+    if not max_bytes:
+        return height
+    return max(1, min(height, int((max_bytes - fixed_bytes) // max(row_bytes, 1))))
+
+
+@functools.lru_cache(maxsize=1)
+def _executor():
+    """所有缩放共用的线程池，第一次用到时才创建"""
+    return ThreadPoolExecutor(max_workers=RESIZE_WORKERS, thread_name_prefix="img8resize")
+
+
+def frame_workers(batch_size, device, intra_op=True):
+    """
+    逐帧处理时实际使用的并行线程数，只有 CPU 上的多帧批次才并行
+    intra_op 为 True 时每帧的计算本身还会用 torch 的 intra-op 线程，线程数按 核数 // torch.get_num_threads() 收紧
+    """
+    if torch.device(device).type != "cpu":
+        return 1
+    workers = min(RESIZE_WORKERS, batch_size)
+    if intra_op:
+        workers = min(workers, (os.cpu_count() or 1) // max(1, torch.get_num_threads()))
+    return max(1, workers)
+
+
+def fold_batch(device):
+    """是否把整批帧并进矩阵的列一次计算：非 CPU 设备上是，CPU 上逐帧计算"""
+    return torch.device(device).type != "cpu"
+
+
+def map_frames(fn, batch_size, workers):
+    """对每一帧执行 fn(b)，workers > 1 时交给线程池并等待全部完成"""
+    if workers <= 1:
+        for b in range(batch_size):
+            fn(b)
+    else:
+        # 取出结果以便把线程内的异常抛给调用方
+        for _ in _executor().map(fn, range(batch_size)):
+            pass
+
+
+# ---------------------------------------------------------------------------
+# torch 后端
+# ---------------------------------------------------------------------------
+
+@register_resampler("torch", "nearest")
+def _torch_nearest(x, out, size, offset=(0, 0), max_bytes=None):
+    batch_size, out_h, out_w, channels = out.shape
+    top, left = offset
+    rows = _nearest_index(x.shape[1], size[0], x.device)[top:top + out_h]
+    cols = _nearest_index(x.shape[2], size[1], x.device)[left:left + out_w]
+    step = strip_rows(out_h, batch_size * out_w * channels * x.element_size(), max_bytes=max_bytes)
+    for row0 in range(0, out_h, step):
+        out[:, row0:row0 + step] = x[:, rows[row0:row0 + step, None], cols[None, :]]
+    return out
+
+
+def _torch_separable(x, out, size, offset=(0, 0), max_bytes=None, method="lanczos"):
+    """先水平后垂直两次稀疏矩阵乘，与 PIL 的处理顺序一致；按输出行分条，每条只处理用到的源行、源列"""
+    batch_size, src_h, src_w, channels = x.shape
+    height, width = out.shape[1], out.shape[2]
+    top, left = offset
+    dtype = compute_dtype(x.dtype)
+    weights_w, col0, col1 = _sparse_weights(src_w, size[1], method, x.device, dtype, left, left + width)
+    workers = frame_workers(batch_size, x.device)
+    if max_bytes:
+        max_bytes = max_bytes / workers  # 并行时内存预算由各线程平分
+    # 整批一起计算时，每条的临时张量同时容纳所有帧
+    fold = fold_batch(x.device)
+    frames = batch_size if fold else 1
+
+    # 每条的临时张量：转置后的源行、水平缩放结果及其转置（与源行数成正比）、垂直缩放结果（与输出行数成正比）
+    item_size = torch.finfo(dtype).bits // 8
+    span_bytes = ((col1 - col0) + 2 * width) * channels * item_size * frames
+    taps = axis_weights(src_h, size[0], method)[0].shape[1]
+    step = strip_rows(
+        height, src_h / size[0] * span_bytes + width * channels * item_size * frames,
+        fixed_bytes=taps * span_bytes, max_bytes=max_bytes,
+    )
+    strips = [
+        (row0,) + _sparse_weights(
+            src_h, size[0], method, x.device, dtype, top + row0, top + min(row0 + step, height)
+        )
+        for row0 in range(0, height, step)
+    ]
+
+    def run_strips(frames_slice):
+        src = x[frames_slice]
+        count = src.shape[0]
+        for row0, weights_h, src0, src1 in strips:
+            span = src1 - src0
+            # [B, span, W, C] -> [W, B*span*C]，水平方向变成矩阵的行，各帧并排在列上
+            # 转置与提升到计算精度在同一次拷贝中完成
+            cols = x.new_empty((col1 - col0, count, span, channels), dtype=dtype)
+            cols.copy_(src[:, src0:src1, col0:col1].permute(2, 0, 1, 3))
+            cols = torch.sparse.mm(weights_w, cols.view(col1 - col0, count * span * channels))
+            # [width, B*span*C] -> [span, B*width*C]，再沿垂直方向缩放
+            rows = cols.view(width, count, span, channels).permute(2, 1, 0, 3).reshape(span, count * width * channels)
+            rows = torch.sparse.mm(weights_h, rows)
+            out[frames_slice, row0:row0 + rows.shape[0]] = rows.view(-1, count, width, channels).transpose(0, 1)
+
+    if fold:
+        run_strips(slice(None))
+    else:
+        map_frames(lambda b: run_strips(slice(b, b + 1)), batch_size, workers)
+    return out
+
+
+for _method in FILTERS:
+    register_resampler("torch", _method)(functools.partial(_torch_separable, method=_method))
+
+
+# ---------------------------------------------------------------------------
+# pil 后端
+# ---------------------------------------------------------------------------
+
+PIL_FILTERS = {
+    "nearest": Image.NEAREST,
+    "bilinear": Image.BILINEAR,
+    "bicubic": Image.BICUBIC,
+    "area": Image.BOX,
+    "lanczos": Image.LANCZOS,
+}
+
+
+def _pil_resize_frame(frame, height, width, resample):
+    """frame: [H, W, C] float32 numpy，逐通道缩放"""
+    out = np.empty((height, width, frame.shape[2]), dtype=np.float32)
+    for c in range(frame.shape[2]):
+        channel = Image.fromarray(np.ascontiguousarray(frame[:, :, c]), mode="F")
+        out[:, :, c] = np.asarray(channel.resize((width, height), resample))
+    return out
+
+
+def _pil_resize(x, out, size, offset=(0, 0), max_bytes=None, method="lanczos"):
+    """PIL 需要整帧输入，不支持分条，只能逐帧整幅缩放后再取出窗口；各帧在线程池中并行"""
+    top, left = offset
+    out_h, out_w = out.shape[1], out.shape[2]
+
+    def run_frame(b):
+        frame = x[b].detach().to("cpu", torch.float32).numpy()
+        frame = _pil_resize_frame(frame, size[0], size[1], PIL_FILTERS[method])
+        out[b] = torch.from_numpy(frame[top:top + out_h, left:left + out_w])
+
+    # PIL 的 resize 是单线程的，线程池按 RESIZE_WORKERS 用满
+    map_frames(run_frame, x.shape[0], frame_workers(x.shape[0], "cpu", intra_op=False))
+    return out
+
+
+for _method in PIL_FILTERS:
+    register_resampler("pil", _method)(functools.partial(_pil_resize, method=_method))
+
+
+# ---------------------------------------------------------------------------
+# 入口
+# ---------------------------------------------------------------------------
+
+def resize(x, height, width, method="lanczos", backend=None, out=None, max_bytes=None, window=None):
+    """
+    缩放 [B, H, W, C] 图像或 [B, H, W] 遮罩，输出与输入 dtype、设备一致
+    method: nearest / bilinear / bicubic / area / lanczos / auto
+    backend: torch / pil，默认 DEFAULT_BACKEND
+    out: 可选的预分配输出（可以是更大画布中的一块视图），结果直接写入其中
+    max_bytes: 分块模式的临时内存上限（字节），为空时整帧处理
+    window: 可选的 (left, top, w, h)，只输出 height×width 缩放结果中的这一块
+    """
+    is_mask = x.dim() == 3
+    src_h, src_w = x.shape[1], x.shape[2]
+    left, top, out_w, out_h = window or (0, 0, width, height)
+    if (src_h, src_w) == (height, width):
+        x = x[:, top:top + out_h, left:left + out_w]
+        return x if out is None else out.copy_(x)
+    if method == "auto":
+        method = auto_method(src_h, src_w, height, width)
+
+    resampler = RESAMPLERS.get((backend or DEFAULT_BACKEND, method))
+    if resampler is None:
+        raise ValueError(f"不支持的缩放方式: {backend or DEFAULT_BACKEND}/{method}")
+
+    if out is None:
+        out = x.new_empty((x.shape[0], out_h, out_w) + tuple(x.shape[3:]))
+    src = x.unsqueeze(-1) if is_mask else x
+    resampler(src, out.unsqueeze(-1) if is_mask else out, (height, width), (top, left), max_bytes)
+
+    if method in ("bicubic", "lanczos"):
+        # 去掉振铃造成的越界值，但保留 HDR 等超出 0-1 的原始取值范围
+        # 取值范围按每一帧的整幅源图计算，与逐帧整幅缩放后再裁剪的结果一致
+        # 取值范围的两端在输出 dtype 中精确可表示，先转换后截断与先截断后转换结果相同
+        dims = tuple(range(1, x.dim()))
+        out.clamp_(x.amin(dim=dims, keepdim=True), x.amax(dim=dims, keepdim=True))
+    return out
@@ -1,11 +1,216 @@
 # 保存为: ComfyUI/custom_nodes/img8_adv_image_loader.py
+import collections
+import glob
 import hashlib
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import folder_paths
 import numpy as np
 import torch
 import node_helpers
-from PIL import Image, ImageOps, ImageSequence
+from PIL import Image, ImageOps
+from . import _img8archive as img8archive
+from . import _img8cache as img8cache
+from . import _img8manifest as img8manifest
+
+# 支持的图片格式
+VALID_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp', '.gif']
+
+# 批量加载时解码线程数的上限（PIL 解码时会释放 GIL）
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+
+
+# EXIF 方向为这些值时图像会旋转 90°，宽高互换
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# 16 位灰度（PNG / TIFF）的模式，按 0~65535 换算为 0~1，不经过 8 位
+# 32 位整数的 "I" 模式取值范围不固定，仍和原来一样按 0~255 换算并截断
+HIGH_BIT_MODES = ("I;16", "I;16B", "I;16L", "I;16N")
+
+
+def target_size(width, height, max_pixels=0, max_side=0):
+    """按像素上限和长边上限（0 表示不限制）计算等比例缩小后的尺寸，只缩小不放大"""
+    scale = 1.0
+    if max_pixels and width * height > max_pixels:
+        scale = (max_pixels / (width * height)) ** 0.5
+    if max_side and max(width, height) * scale > max_side:
+        scale = max_side / max(width, height)
+    if scale >= 1.0:
+        return width, height
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def decode_image(path, max_pixels=0, max_side=0, frame_stride=1, frame_limit=0):
+    """
+    把图片解码为 [N, H, W, 3] 的 float32 张量，文件没变时直接返回解码缓存中的结果
+    多页 TIFF、动图按 frame_stride 间隔取帧，最多 frame_limit 帧（0 表示不限）；普通图片 N 为 1
+    给出 max_pixels / max_side 时直接解码为缩小后的图片；这些参数都是缓存键的一部分
+    """
+    key = img8archive.decode_key(path) + (max_pixels, max_side, frame_stride, frame_limit)
+    image_tensor = img8cache.DECODE_CACHE.get(key)
+    if image_tensor is None:
+        image_tensor = _decode_file(path, max_pixels, max_side, frame_stride, frame_limit)
+        img8cache.DECODE_CACHE.put(key, image_tensor)
+    return image_tensor
+
+
+def _frame_array(frame, size):
+    """
+    把一帧转换为 numpy 数组，返回 (数组, 除数)：8 位图为 [H, W, 3] 的 uint8，除数 255；
+    16 位灰度、32 位整数和浮点图在 F 模式下缩放，返回 [H, W, 1] 的 float32，写入时广播为 3 通道
+    """
+    if frame.mode in HIGH_BIT_MODES or frame.mode in ("I", "F"):
+        divisor = {"F": 1.0, "I": 255.0}.get(frame.mode, 65535.0)
+        frame = frame.convert("F")
+        if size is not None and frame.size != size:
+            frame = frame.resize(size, Image.LANCZOS)
+        return np.array(frame)[..., None], divisor
+
+    frame = frame.convert("RGB")
+    if size is not None and frame.size != size:
+        frame = frame.resize(size, Image.LANCZOS)
+    return np.array(frame), 255.0
+
+
+def _decode_file(path, max_pixels=0, max_side=0, frame_stride=1, frame_limit=0):
+    # 加载图像（简化版，无遮罩处理）
+    # 归档中的图片（"归档::成员"）直接从归档读入内存解码，不需要解压
+    img = node_helpers.pillow(Image.open, img8archive.read_source(path))
+
+    # 下游限制了尺寸时先算出目标尺寸：JPEG 用 draft() 在 DCT 阶段按 1/2、1/4、1/8 缩小解码
+    # （结果不小于目标尺寸），其他格式照常解码，最后都在 8 位 RGB 上用 LANCZOS 精确缩放到目标尺寸
+    size = target_size(img.width, img.height, max_pixels, max_side)
+    if size == img.size:
+        size = None
+    else:
+        if img.format == "JPEG":
+            img.draft("RGB", size)
+        if img.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+            size = (size[1], size[0])
+
+    # 逐帧解码，直接写入预分配的 [N, H, W, 3] 张量，不保留逐帧的中间列表
+    # 尺寸与第一帧不同的帧（少数多页 TIFF 里的缩略页）跳过
+    indices = range(0, getattr(img, "n_frames", 1), max(1, frame_stride))
+    if frame_limit:
+        indices = indices[:frame_limit]
+    output = None
+    first_size = None
+    count = 0
+    for index in indices:
+        img.seek(index)
+        frame = node_helpers.pillow(ImageOps.exif_transpose, img)
+        if first_size is None:
+            first_size = frame.size
+        elif frame.size != first_size:
+            print(f"🖼️ [img8] 跳过尺寸不同的第 {index} 帧: {path}")
+            continue
+
+        # 转换为RGB和Tensor格式
+        array, divisor = _frame_array(frame, size)
+        if output is None:
+            output = torch.empty((len(indices), array.shape[0], array.shape[1], 3), dtype=torch.float32)
+        frame_tensor = output[count].copy_(torch.from_numpy(array)).div_(divisor)
+        if array.shape[-1] == 1:
+            frame_tensor.clamp_(0.0, 1.0)
+        count += 1
+
+    if count < len(indices):
+        output = output[:count].clone()
+    return output
+
+
+def print_cache_stats():
+    stats = img8cache.DECODE_CACHE.stats()
+    print(f"🖼️ [img8] 解码缓存: 命中 {stats['hits']} / 未命中 {stats['misses']} / 淘汰 {stats['evictions']}，"
+          f"占用 {stats['bytes'] / 1048576:.1f}/{stats['max_bytes'] / 1048576:.0f} MB")
+
+
+class DecodePool:
+    """
+    有界的解码线程池：按路径提交解码任务并保存结果，下游节点运行时后台继续解码后面的文件
+    已解码但还没被取走的结果总大小超过上限时，丢弃最早提交的预取结果
+    """
+
+    def __init__(self, workers=DECODE_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.pending = collections.OrderedDict()  # (path, 解码参数...) -> Future，按提交顺序
+        self.lock = threading.Lock()
+
+    def _submit(self, key):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="img8decode")
+        return self.executor.submit(decode_image, *key)
+
+    def prefetch(self, paths, max_bytes, options=()):
+        """后台预取 paths，options 为传给 decode_image 的其余参数；已在队列中的不重复提交"""
+        with self.lock:
+            for path in paths:
+                key = (path,) + tuple(options)
+                if key not in self.pending:
+                    self.pending[key] = self._submit(key)
+            self._trim(max_bytes)
+
+    def get(self, path, options=()):
+        """取出一张图片的解码结果，没有预取过就立即解码（阻塞等待）"""
+        key = (path,) + tuple(options)
+        with self.lock:
+            future = self.pending.pop(key, None)
+            if future is None:
+                future = self._submit(key)
+        return future.result()
+
+    def _trim(self, max_bytes):
+        buffered = 0
+        for future in self.pending.values():
+            if future.done() and future.exception() is None:
+                buffered += future.result().nbytes
+        while buffered > max_bytes and self.pending:
+            _, future = self.pending.popitem(last=False)
+            if not future.cancel() and future.done() and future.exception() is None:
+                buffered -= future.result().nbytes
+
+
+# 全局共用的解码池，index 模式下跨多次执行保留预取结果
+DECODE_POOL = DecodePool()
+
+
+def list_images(source, recursive=False):
+    """
+    把输入展开为图片路径列表（绝对路径，去重，保持顺序）
+    每行可以是文件夹、通配符（如 D:/data/**/*.png）或单个文件；
+    也可以是 zip / tar 归档（其中全部图片）或 "归档::成员"、"归档::目录"、"归档::通配符"
+    """
+    paths = []
+    for line in source.splitlines():
+        entry = line.strip().strip('"')
+        if not entry:
+            continue
+        if img8archive.split_path(entry)[0] is not None or img8archive.is_archive(entry):
+            paths.extend(
+                path for path in img8archive.list_paths(entry)
+                if os.path.splitext(path)[1].lower() in VALID_EXTENSIONS
+            )
+            continue
+        if os.path.isdir(entry):
+            if recursive:
+                found = [os.path.join(root, name) for root, _, names in os.walk(entry) for name in names]
+            else:
+                found = [os.path.join(entry, name) for name in os.listdir(entry)]
+            found = sorted(found)
+        elif glob.has_magic(entry):
+            found = sorted(glob.glob(entry, recursive=True))
+        elif os.path.isfile(entry):
+            found = [entry]
+        else:
+            raise FileNotFoundError(f"图片路径不存在: {entry}")
+        paths.extend(
+            os.path.abspath(path) for path in found
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in VALID_EXTENSIONS
+        )
+    return list(dict.fromkeys(paths))
+
 
 class Img8AdvImageLoader:
     """高级图像加载器 - 支持完整路径输入，输出原始真实路径"""
@@ -17,9 +222,17 @@ class Img8AdvImageLoader:
                 "image_path": ("STRING", {
                     "default": "",
                     "multiline": False,
-                    "placeholder": "输入完整图片路径，如：C:/Users/name/Pictures/image.jpg"
+                    "placeholder": "输入完整图片路径，如：C:/Users/name/Pictures/image.jpg 或 D:/data/shard.tar::0001.jpg"
                 }),
             },
+            "optional": {
+                # 下游会缩小图片时填上对应的上限，大图直接解码为缩小后的尺寸；0 表示不限制
+                "max_pixels": ("INT", {"default": 0, "min": 0, "max": 10**8, "step": 1}),
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384, "step": 8}),
+                # 多页 TIFF / 动图：每隔 frame_stride 帧取一帧，最多 frame_limit 帧（0 表示全部）
+                "frame_stride": ("INT", {"default": 1, "min": 1, "max": 1000, "step": 1}),
+                "frame_limit": ("INT", {"default": 0, "min": 0, "max": 100000, "step": 1}),
+            },
         }
     
     CATEGORY = "utils"
@@ -29,48 +242,38 @@ class Img8AdvImageLoader:
     RETURN_NAMES = ("image", "path", "path_string")
     FUNCTION = "load_image"
 
-    def load_image(self, image_path):
+    def load_image(self, image_path, max_pixels=0, max_side=0, frame_stride=1, frame_limit=0):
         """从完整路径加载图像"""
         
-        # 验证路径
-        if not image_path or not os.path.exists(image_path):
+        # 验证路径（普通文件或 "归档::成员"）
+        if not image_path or not img8archive.exists(image_path):
             raise FileNotFoundError(f"图片路径不存在: {image_path}")
         
         # 验证文件格式
-        valid_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp', '.tif'}
         file_ext = os.path.splitext(image_path)[1].lower()
-        if file_ext not in valid_extensions:
-            raise ValueError(f"不支持的图片格式: {file_ext}。支持: {', '.join(valid_extensions)}")
+        if file_ext not in VALID_EXTENSIONS:
+            raise ValueError(f"不支持的图片格式: {file_ext}。支持: {', '.join(VALID_EXTENSIONS)}")
         
         # 使用原始完整路径
-        original_path = os.path.abspath(image_path)
-        
-        # 加载图像（简化版，无遮罩处理）
-        img = node_helpers.pillow(Image.open, original_path)
-        img = node_helpers.pillow(ImageOps.exif_transpose, img)
-        
-        # 转换为RGB和Tensor格式
-        if img.mode == "I":
-            img = img.point(lambda i: i * (1 / 255))
-        
-        image = img.convert("RGB")
-        image_np = np.array(image).astype(np.float32) / 255.0
-        image_tensor = torch.from_numpy(image_np)[None,]
+        original_path = img8archive.normalize(image_path)
+        image_tensor = decode_image(original_path, max_pixels, max_side, frame_stride, frame_limit)
         
         # 关键：第一个路径输出保持为PATH类型对象
         # 第二个路径输出为STRING类型
         return (image_tensor, original_path, original_path)
 
     @classmethod
-    def IS_CHANGED(cls, image_path):
+    def IS_CHANGED(cls, image_path, max_pixels=0, max_side=0, frame_stride=1, frame_limit=0):
         """用于检测文件是否更改（缓存机制）"""
-        if not image_path or not os.path.exists(image_path):
+        if not image_path or not img8archive.exists(image_path):
             return ""
         
-        m = hashlib.sha256()
-        with open(image_path, "rb") as f:
-            m.update(f.read())
-        return m.digest().hex()
+        # 归档中的图片用归档的大小、修改时间加成员名判断，不哈希整个归档
+        if img8archive.split_path(image_path)[0] is not None:
+            return str(img8archive.stat_key(image_path))
+        
+        # 大小、修改时间、inode 都没变时直接使用索引中记录的哈希，不再读整个文件
+        return img8cache.fingerprint(image_path)
 
     @classmethod
     def VALIDATE_INPUTS(cls, image_path):
@@ -78,21 +281,171 @@ class Img8AdvImageLoader:
         if not image_path:
             return "图片路径不能为空"
         
-        if not os.path.exists(image_path):
+        if not img8archive.exists(image_path):
             return f"文件不存在: {image_path}"
         
-        valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp']
         file_ext = os.path.splitext(image_path)[1].lower()
-        if file_ext not in valid_extensions:
+        if file_ext not in VALID_EXTENSIONS:
             return f"不支持的文件格式: {file_ext}"
         
         return True
 
+class Img8BatchImageLoader:
+    """
+    批量图像加载器 - 按文件夹 / 通配符 / 路径列表载入多张图片，输出图片列表和对应的真实路径
+    all 模式一次输出全部图片；index 模式每次执行输出第 index 张，配合批处理插件逐张反推
+    解码在有界线程池中进行，并提前预取后面 prefetch 张，与下游推理重叠
+    填写 manifest 时跳过清单中已有匹配记录（同一模型、提示词、图片内容）的图片，中断后重跑只处理缺少的部分
+    """
+
+    # index 模式下待处理列表的快照：{(来源, 递归, 清单, 模型键, 提示词键): [路径, ...]}
+    # 运行过程中不断有图片写入清单，如果每次都重新过滤，序号会错位；index 为 0 时重新生成
+    pending_lists = {}
+    # IS_CHANGED 刚重新生成、load_images 还没用过的快照，同一次执行中不再重复过滤
+    fresh_lists = set()
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "source": ("STRING", {
+                    "default": "",
+                    "multiline": True,
+                    "placeholder": "每行一个文件夹、通配符、图片路径或 zip/tar 归档，如：C:/Users/name/Pictures、D:/data/**/*.png 或 D:/data/shard.tar"
+                }),
+                "mode": (["all", "index"], {"default": "all"}),
+                "index": ("INT", {"default": 0, "min": 0, "max": 0xffffffff, "step": 1}),
+                "recursive": ("BOOLEAN", {"default": False}),
+                "prefetch": ("INT", {"default": 4, "min": 0, "max": 64, "step": 1}),
+                # 预取缓冲区的内存上限（MB），已解码但还没用到的图片超过上限时丢弃
+                "memory_cap_mb": ("INT", {"default": 1024, "min": 64, "max": 65536, "step": 64}),
+            },
+            "optional": {
+                # 下游会缩小图片时填上对应的上限，大图直接解码为缩小后的尺寸；0 表示不限制
+                "max_pixels": ("INT", {"default": 0, "min": 0, "max": 10**8, "step": 1}),
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384, "step": 8}),
+                # 多页 TIFF / 动图：每隔 frame_stride 帧取一帧，最多 frame_limit 帧（0 表示全部）
+                "frame_stride": ("INT", {"default": 1, "min": 1, "max": 1000, "step": 1}),
+                "frame_limit": ("INT", {"default": 0, "min": 0, "max": 100000, "step": 1}),
+                # 反推清单（与 img8txtsaver 填同一个），为空表示不跳过；只写文件名时放在 ComfyUI 的 user 目录
+                "manifest": ("STRING", {"default": ""}),
+                # 接模型加载节点的 llama_model、以及送进 llama_cpp_instruct_adv 的同一个提示词 / 系统提示词，
+                # 与 img8txtsaver 接同样的来源，换模型或提示词后会重新反推
+                "llama_model": ("LLAMACPPMODEL",),
+                "prompt": ("STRING", {"forceInput": True}),
+                "system_prompt": ("STRING", {"forceInput": True}),
+            },
+        }
+    
+    CATEGORY = "utils"
+    
+    RETURN_TYPES = ("IMAGE", "PATH", "STRING", "INT")
+    RETURN_NAMES = ("images", "paths", "path_strings", "count")
+    OUTPUT_IS_LIST = (True, True, True, False)
+    FUNCTION = "load_images"
+
+    def load_images(self, source, mode="all", index=0, recursive=False, prefetch=4, memory_cap_mb=1024,
+                    max_pixels=0, max_side=0, frame_stride=1, frame_limit=0, manifest="", llama_model=None,
+                    prompt="", system_prompt=""):
+        paths = list_images(source, recursive)
+        if not paths:
+            raise FileNotFoundError(f"没有找到图片: {source}")
+        keys = self.manifest_keys(llama_model, prompt, system_prompt)
+        paths = self.pending_paths(paths, source, recursive, manifest, keys,
+                                   refresh=(mode != "index" or index == 0), reuse_fresh=(mode == "index"))
+        if not paths:
+            print("🖼️ [img8] 批量加载: 全部图片都已在清单中，没有需要处理的图片")
+            return ([], [], [], 0)
+        max_bytes = memory_cap_mb * 1024 * 1024
+        options = (max_pixels, max_side, frame_stride, frame_limit)
+
+        if mode == "index":
+            # 只输出一张，并在后台预取接下来的几张，下一次执行时直接取用
+            path = paths[index % len(paths)]
+            image = DECODE_POOL.get(path, options)
+            following = [paths[(index + k) % len(paths)] for k in range(1, min(prefetch, len(paths) - 1) + 1)]
+            DECODE_POOL.prefetch(following, max_bytes, options)
+            print(f"🖼️ [img8] 批量加载: 第 {index % len(paths) + 1}/{len(paths)} 张 {path}")
+            print_cache_stats()
+            return ([image], [path], [path], len(paths))
+
+        images = []
+        for i, path in enumerate(paths):
+            # 保持 prefetch 张在解码中，当前这张解码完成前后面的已经开始
+            DECODE_POOL.prefetch(paths[i + 1:i + 1 + prefetch], max_bytes, options)
+            images.append(DECODE_POOL.get(path, options))
+        print(f"🖼️ [img8] 批量加载: 共 {len(paths)} 张图片")
+        print_cache_stats()
+        return (images, paths, paths, len(paths))
+
+    @staticmethod
+    def manifest_keys(llama_model, prompt, system_prompt):
+        """(模型键, 提示词键)，与 img8txtsaver 记录清单时的算法相同"""
+        return img8manifest.model_key(llama_model), img8manifest.prompt_key(prompt, system_prompt)
+
+    @classmethod
+    def pending_paths(cls, paths, source, recursive, manifest, keys, refresh=True,
+                      mark_fresh=False, reuse_fresh=False):
+        """
+        去掉清单中已有匹配记录的图片；不使用清单时原样返回
+        IS_CHANGED 以 mark_fresh 调用，重新生成的快照标记为刚生成；紧接着的 load_images 以 reuse_fresh 调用时
+        直接使用这个快照，不再过滤第二遍
+        """
+        book = img8manifest.open_manifest(manifest)
+        if book is None:
+            return paths
+        snapshot_key = (source, recursive, book.path) + tuple(keys)
+        fresh = snapshot_key in cls.fresh_lists
+        cls.fresh_lists.discard(snapshot_key)
+        if (refresh and not (fresh and reuse_fresh)) or snapshot_key not in cls.pending_lists:
+            pending = book.pending(paths, *keys)
+            cls.pending_lists[snapshot_key] = pending
+            if mark_fresh:
+                cls.fresh_lists.add(snapshot_key)
+            if len(pending) < len(paths):
+                print(f"🖼️ [img8] 清单中已有 {len(paths) - len(pending)} 张图片的记录，跳过，剩余 {len(pending)} 张")
+        return cls.pending_lists[snapshot_key]
+
+    @classmethod
+    def IS_CHANGED(cls, source, mode="all", index=0, recursive=False, prefetch=4, memory_cap_mb=1024,
+                   max_pixels=0, max_side=0, frame_stride=1, frame_limit=0, manifest="", llama_model=None,
+                   prompt="", system_prompt=""):
+        """列表或任一文件的大小、修改时间变化时重新执行（只做 stat，不读文件内容）"""
+        try:
+            paths = list_images(source, recursive)
+        except OSError:
+            return ""
+        if mode == "index" and paths:
+            # 与 load_images 使用同一个待处理快照，按序号取到的是同一张图片
+            paths = cls.pending_paths(paths, source, recursive, manifest,
+                                      cls.manifest_keys(llama_model, prompt, system_prompt),
+                                      refresh=(index == 0), mark_fresh=True)
+            paths = [paths[index % len(paths)]] if paths else []
+        m = hashlib.sha256()
+        for path in paths:
+            m.update(f"{path}|{img8archive.stat_key(path)}\n".encode("utf-8"))
+        # all 模式下清单有新记录时输出会变化
+        if mode != "index" and manifest and manifest.strip():
+            book_path = img8manifest.manifest_path(manifest)
+            for path in (book_path, book_path + "-wal"):
+                if os.path.exists(path):
+                    m.update(f"{path}|{img8cache.stat_key(path)}\n".encode("utf-8"))
+        return m.hexdigest()
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, source, **kwargs):
+        """验证输入"""
+        if not source or not source.strip():
+            return "图片来源不能为空"
+        return True
+
 # 注册节点
 NODE_CLASS_MAPPINGS = {
-    "Img8AdvImageLoader": Img8AdvImageLoader
+    "Img8AdvImageLoader": Img8AdvImageLoader,
+    "Img8BatchImageLoader": Img8BatchImageLoader
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "Img8AdvImageLoader": "🖼️img8:qwenimgloader4realpath"
+    "Img8AdvImageLoader": "🖼️img8:qwenimgloader4realpath",
+    "Img8BatchImageLoader": "🖼️img8:batchimgloader4realpath"
 }
\ No newline at end of file
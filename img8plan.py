@@ -0,0 +1,50 @@
+from . import _img8plan as img8plan
+
+class img8plan_node:
+    """
+    对齐尺寸规划节点
+
+    功能：
+    给定宽高比（来自输入图像或手动填写的宽高）、对齐倍数和像素预算，
+    输出不超过预算的最大对齐尺寸，宽高比失真最小。与 img8x / img88 / img8sc 内部使用的是同一个规划器
+    max_pixels 小于 multiple × multiple 时放不下任何对齐尺寸，输出 multiple × multiple 并打印提示
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "width": ("INT", {"default": 1024, "min": 1, "max": 16384, "step": 1}),
+                "height": ("INT", {"default": 1024, "min": 1, "max": 16384, "step": 1}),
+                "multiple": ("INT", {"default": 64, "min": 1, "max": 1024, "step": 1}),
+                "max_pixels": ("INT", {"default": 1048576, "min": 64, "max": 0xffffffff, "step": 1}),
+            },
+            "optional": {
+                "image": ("IMAGE",),  # 接入图像时使用图像的宽高比，忽略 width/height
+            }
+        }
+
+    RETURN_TYPES = ("INT", "INT")
+    RETURN_NAMES = ("width", "height")
+    FUNCTION = "plan"
+    CATEGORY = "image/processing"
+    DESCRIPTION = "按宽高比、对齐倍数和像素预算规划输出尺寸"
+
+    def plan(self, width, height, multiple, max_pixels, image=None):
+        if image is not None:
+            height, width = int(image.shape[1]), int(image.shape[2])
+
+        out_w, out_h = img8plan.plan_size(width / height, multiple, max_pixels)
+        if out_w * out_h > max_pixels:
+            print(f"[img8plan] ⚠️ 像素预算 {max_pixels} 小于 {multiple}x{multiple}，只能输出最小的对齐尺寸")
+        print(f"[img8plan] {width}x{height} -> {out_w}x{out_h} (倍数 {multiple}, 像素 {out_w * out_h}/{max_pixels})")
+        return (out_w, out_h)
+
+# 节点注册
+NODE_CLASS_MAPPINGS = {
+    "img8plan": img8plan_node
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "img8plan": "img8plan (Aligned Size Planner)"
+}
\ No newline at end of file
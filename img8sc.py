@@ -1,9 +1,14 @@
 import torch
-import torchvision.transforms as T
-from PIL import Image
-import numpy as np
+from . import _img8ops as img8ops
+from . import _img8plan as img8plan
+from . import _img8presets as img8presets
+from . import _img8resample as img8resample
 
 class Img8sc:
+    """
+    缩放并裁剪：等比例缩放到完全覆盖目标尺寸，再按位置裁剪
+    目标宽高先调整为 base 的倍数（默认8，与原 img8sc 相同）
+    """
     def __init__(self):
         pass
 
@@ -13,12 +18,17 @@ class Img8sc:
             "required": {
                 "width": ("INT", {"default": 480, "min": 8, "max": 8192, "step": 1}),
                 "height": ("INT", {"default": 832, "min": 8, "max": 8192, "step": 1}),
-                "scale_method": (["nearest", "bilinear", "lanczos"], {"default": "lanczos"}),
+                "scale_method": (["nearest", "bilinear", "lanczos", "bicubic", "area"], {"default": "lanczos"}),
                 "position": (["up", "left", "down", "right", "middle"], {"default": "middle"}),
+                "base": ("INT", {"default": 8, "min": 2, "max": 512, "step": 1}),  # 对齐基数
             },
             "optional": {
                 "image": ("IMAGE",),
                 "mask": ("MASK",),
+                # 分块缩放的临时内存上限（MB），0 表示整帧处理；两种方式输出完全一致
+                "tile_budget_mb": ("INT", {"default": 0, "min": 0, "max": 65536, "step": 64}),
+                # 可选的模型分辨率预设（与 imgx8e 共用预设表），选中后覆盖 width/height
+                "preset": (["none"] + img8presets.REGISTRY.choices(), {"default": "none"}),
             }
         }
 
@@ -27,17 +37,22 @@ class Img8sc:
     FUNCTION = "process"
     CATEGORY = "image"
 
-    def process(self, width, height, scale_method, position, image=None, mask=None):
-        # 步骤1: 调整尺寸为8的倍数
-        target_width = self.round_to_multiple_of_8(width)
-        target_height = self.round_to_multiple_of_8(height)
+    def process(self, width, height, scale_method, position, base=8, image=None, mask=None, tile_budget_mb=0,
+                preset="none"):
+        record = img8presets.REGISTRY.lookup(preset)
+        if record is not None:
+            width, height = record.width, record.height
+
+        # 步骤1: 调整尺寸为base的倍数
+        target_width = img8plan.align_nearest(width, base)
+        target_height = img8plan.align_nearest(height, base)
+
+        max_bytes = tile_budget_mb * 1024 * 1024 if tile_budget_mb else None
 
         if image is not None:
-            # 将tensor转换为PIL Image
-            i = 255. * image[0].cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            
-            orig_width, orig_height = img.size
+            # 直接在张量上整批处理，保持输入的 dtype 和设备
+            img = image
+            orig_height, orig_width = img.shape[1], img.shape[2]
             
             # 计算缩放比例，确保完全覆盖目标尺寸
             scale_w = target_width / orig_width
@@ -50,31 +65,19 @@ class Img8sc:
             new_width = int(orig_width * scale)
             new_height = int(orig_height * scale)
             
-            # 使用指定算法进行缩放
-            if scale_method == "nearest":
-                resample = Image.NEAREST
-            elif scale_method == "bilinear":
-                resample = Image.BILINEAR
-            elif scale_method == "lanczos":
-                resample = Image.LANCZOS
-            
-            img_resized = img.resize((new_width, new_height), resample)
-            
-            # 裁剪到目标尺寸
-            img_cropped = self.crop_image(img_resized, target_width, target_height, position)
-            
-            # 转换回tensor
-            img_out = np.array(img_cropped).astype(np.float32) / 255.0
-            img_out = torch.from_numpy(img_out)[None,]
+            # 先按位置算出裁剪区域，只缩放要保留的部分（与整幅缩放后再裁剪逐像素一致）
+            window = img8ops.crop_box(new_width, new_height, target_width, target_height, position)
+            img_out = img8resample.resize(
+                img, new_height, new_width, scale_method, max_bytes=max_bytes, window=window
+            )
         else:
             img_out = torch.zeros((1, target_height, target_width, 3), dtype=torch.float32)
         
         if mask is not None:
-            # 处理遮罩
-            m = mask.squeeze().cpu().numpy()
-            mask_pil = Image.fromarray(np.clip(m * 255, 0, 255).astype(np.uint8), mode="L")
+            # 处理遮罩，统一为 [B, H, W] 后整批缩放
+            m = img8ops.as_mask_batch(mask)
             
-            orig_mask_width, orig_mask_height = mask_pil.size
+            orig_mask_height, orig_mask_width = m.shape[1], m.shape[2]
             
             # 按相同比例缩放遮罩
             scale_w = target_width / orig_mask_width
@@ -84,65 +87,22 @@ class Img8sc:
             new_mask_width = int(orig_mask_width * scale)
             new_mask_height = int(orig_mask_height * scale)
             
-            mask_resized = mask_pil.resize((new_mask_width, new_mask_height), resample)
-            mask_cropped = self.crop_image(mask_resized, target_width, target_height, position)
-            
-            # 转换回tensor
-            mask_out = np.array(mask_cropped).astype(np.float32) / 255.0
-            mask_out = torch.from_numpy(mask_out)
+            # 使用与图像相同的重采样算法，同样只缩放裁剪区域
+            window = img8ops.crop_box(new_mask_width, new_mask_height, target_width, target_height, position)
+            mask_out = img8resample.resize(
+                m, new_mask_height, new_mask_width, scale_method, max_bytes=max_bytes, window=window
+            )
         else:
-            mask_out = torch.zeros((target_height, target_width), dtype=torch.float32)
+            batch_size = image.shape[0] if image is not None else 1
+            mask_out = torch.zeros((batch_size, target_height, target_width), dtype=torch.float32)
 
         return (img_out, mask_out)
 
-    def round_to_multiple_of_8(self, n):
-        """将数字调整为最接近的8的倍数"""
-        remainder = n % 8
-        if remainder <= 4:
-            return n - remainder
-        else:
-            return n + (8 - remainder)
-
-    def crop_image(self, img, target_width, target_height, position):
-        """根据位置裁剪图像"""
-        orig_width, orig_height = img.size
-        
-        # 计算需要裁剪的区域
-        delta_width = orig_width - target_width
-        delta_height = orig_height - target_height
-        
-        if delta_width > 0:
-            # 如果宽度超出，按位置裁剪
-            if position in ["left", "up"]:  # up用于宽度裁剪时视为left
-                left = 0
-            elif position in ["right", "down"]:  # down用于宽度裁剪时视为right
-                left = delta_width
-            else:  # middle
-                left = delta_width // 2
-            right = left + target_width
-        else:
-            left = 0
-            right = orig_width
-        if delta_height > 0:
-            # 如果高度超出，按位置裁剪
-            if position in ["up", "left"]:  # left用于高度裁剪时视为up
-                top = 0
-            elif position in ["down", "right"]:  # right用于高度裁剪时视为down
-                top = delta_height
-            else:  # middle
-                top = delta_height // 2
-            bottom = top + target_height
-        else:
-            top = 0
-            bottom = orig_height
-        
-        return img.crop((left, top, right, bottom))
-
 # 注册节点
 NODE_CLASS_MAPPINGS = {
     "img8sc": Img8sc
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "img8sc": "img8sc (Image Scale & Crop)"
+    "img8sc": "img8sc(Image Scale&Crop to base*)"
 }
\ No newline at end of file
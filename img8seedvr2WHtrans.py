@@ -1,6 +1,8 @@
 import torch
 import numpy as np
 from PIL import Image
+from . import _img8plan as img8plan
+from . import _img8presets as img8presets
 
 class img8seedvr2WHtrans:
     """
@@ -25,6 +27,10 @@ class img8seedvr2WHtrans:
                 "target_mode": (["target_long", "target_short"], {
                     "default": "target_long"
                 }),
+            },
+            "optional": {
+                # 可选的模型分辨率预设（与 imgx8e 共用预设表），选中后按模式取预设的长边或短边作为 target_num
+                "preset": (["none"] + img8presets.REGISTRY.choices(), {"default": "none"}),
             }
         }
     
@@ -34,18 +40,16 @@ class img8seedvr2WHtrans:
     CATEGORY = "image/processing"
     DESCRIPTION = "为seedvr2节点转换目标尺寸参数"
 
-    def calculate(self, image, target_num, target_mode):
-        # 函数：向上矫正到能被8整除
-        def round_up_to_multiple_of_8(value):
-            return ((value + 7) // 8) * 8
-        
-        # 函数：检查是否能被8整除
-        def is_multiple_of_8(value):
-            return value % 8 == 0
-        
+    def calculate(self, image, target_num, target_mode, preset="none"):
+        record = img8presets.REGISTRY.lookup(preset)
+        if record is not None:
+            sides = (record.width, record.height)
+            target_num = max(sides) if target_mode == "target_long" else min(sides)
+            print(f"[img8seedvr2WHtrans] 使用预设 {preset}: target_num = {target_num}")
+
         # 1. 如果是target_short模式，直接对用户输入向上矫正
         if target_mode == "target_short":
-            corrected_output = round_up_to_multiple_of_8(target_num)
+            corrected_output = img8plan.align_up(target_num, 8)
             print(f"[img8seedvr2WHtrans] target_short模式: 输入{target_num} -> 输出{corrected_output}")
             return (corrected_output,)
         
@@ -63,7 +67,7 @@ class img8seedvr2WHtrans:
         # 如果是正方形图像
         if long_side == short_side:
             # 直接对用户输入向上矫正
-            corrected_output = round_up_to_multiple_of_8(target_num)
+            corrected_output = img8plan.align_up(target_num, 8)
             print(f"[img8seedvr2WHtrans] 正方形图像: 输入{target_num} -> 输出{corrected_output}")
             return (corrected_output,)
         
@@ -74,12 +78,8 @@ class img8seedvr2WHtrans:
         # 四舍五入到最接近的整数
         rounded_output = round(float_output)
         
-        # 检查四舍五入后的结果是否能被8整除
-        if is_multiple_of_8(rounded_output):
-            final_output = rounded_output
-        else:
-            # 如果不能被8整除，向上矫正
-            final_output = round_up_to_multiple_of_8(rounded_output)
+        # 不能被8整除时向上矫正（已经是8的倍数则保持不变）
+        final_output = img8plan.align_up(rounded_output, 8)
         
         # 确保输出至少为8（最小有效值）
         final_output = max(8, final_output)
@@ -0,0 +1,238 @@
+# 保存为: ComfyUI/custom_nodes/img8shardwriter.py
+import atexit
+import io
+import json
+import os
+import re
+import tarfile
+import threading
+import time
+from . import _img8archive as img8archive
+from . import _img8cache as img8cache
+
+TAR_BLOCK = 512
+
+
+def member_bytes(size):
+    """一个 tar 成员实际占用的字节数：512 字节的头加上按 512 对齐的数据"""
+    return TAR_BLOCK + (size + TAR_BLOCK - 1) // TAR_BLOCK * TAR_BLOCK
+
+
+class ShardWriter:
+    """
+    按顺序写 WebDataset 格式的 tar 分片：每个样本为 <key>.<图片扩展名>、<key>.txt、<key>.json 三个成员
+    分片写满 max_bytes 后关闭并开始下一个；写入中的分片名为 .tar.tmp，关闭后才改名为 .tar 并记入索引，
+    中断时索引里只有完整的分片。索引文件 <prefix>-index.json 记录每个分片的样本数、大小和首尾 key
+    """
+
+    def __init__(self, output_dir, prefix):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.index_path = os.path.join(output_dir, f"{prefix}-index.json")
+        self.lock = threading.Lock()
+        self.tar = None
+        self.shard = None      # 当前分片的信息，写入索引时用
+        self.shards = []
+        self.next_key = 0
+        self._load_index()
+
+    def _load_index(self):
+        """
+        接着已有的索引继续编号，已有分片不会被覆盖
+        索引不存在、已损坏或缺少某些已有分片时（如写索引前被中断），扫描已有分片重建索引，key 不会重复
+        """
+        pattern = re.compile(rf"^{re.escape(self.prefix)}-(\d+)\.tar$")
+        names = sorted(name for name in os.listdir(self.output_dir) if pattern.match(name)) \
+            if os.path.isdir(self.output_dir) else []
+        self.next_shard = max((int(pattern.match(name).group(1)) for name in names), default=-1) + 1
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.shards = list(data["shards"])
+            self.next_key = max([int(data["samples"])] +
+                                [int(shard["last_key"]) + 1 for shard in self.shards if shard.get("last_key")])
+            if set(names) <= {shard["name"] for shard in self.shards}:
+                return
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            pass
+        if names:
+            self._rebuild_index(names)
+
+    def _rebuild_index(self, names):
+        """读取已有分片的成员名，重新统计每个分片的样本数和首尾 key，下一个 key 接在最大的 key 之后"""
+        print(f"🗂️ [img8] 分片索引缺失或不完整，正在扫描已有分片: {self.output_dir}")
+        self.shards = []
+        last = -1
+        for name in names:
+            path = os.path.join(self.output_dir, name)
+            keys = set()
+            try:
+                with tarfile.open(path, "r:") as tar:
+                    for info in tar:
+                        key = info.name.split(".", 1)[0]
+                        if key.isdigit():
+                            keys.add(key)
+            except (OSError, tarfile.TarError) as e:
+                raise RuntimeError(f"无法读取已有分片 {path}，为避免 key 重复已停止写入: {e}")
+            keys = sorted(keys, key=int)
+            self.shards.append({"name": name, "samples": len(keys), "bytes": os.path.getsize(path),
+                                "first_key": keys[0] if keys else None, "last_key": keys[-1] if keys else None})
+            last = max([last] + [int(key) for key in keys])
+        self.next_key = last + 1
+        img8cache.atomic_write_json(self.index_path, {
+            "format": "webdataset",
+            "samples": sum(shard["samples"] for shard in self.shards),
+            "shards": self.shards,
+        })
+
+    def _open(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"{self.prefix}-{self.next_shard:06d}.tar"
+        self.next_shard += 1
+        path = os.path.join(self.output_dir, name)
+        self.tar = tarfile.open(path + ".tmp", "w", format=tarfile.USTAR_FORMAT)
+        self.shard = {"name": name, "samples": 0, "bytes": 0, "first_key": None, "last_key": None}
+
+    def _close(self):
+        if self.tar is None:
+            return
+        self.tar.close()
+        path = os.path.join(self.output_dir, self.shard["name"])
+        os.replace(path + ".tmp", path)
+        self.shard["bytes"] = os.path.getsize(path)
+        self.shards.append(self.shard)
+        self.tar = None
+        self.shard = None
+        img8cache.atomic_write_json(self.index_path, {
+            "format": "webdataset",
+            "samples": sum(shard["samples"] for shard in self.shards),
+            "shards": self.shards,
+        })
+        print(f"📦 [img8] 分片已完成: {path}")
+
+    def write(self, image_path, caption, max_bytes):
+        """写入一个样本，返回它的 key"""
+        image = img8archive.read_bytes(image_path)
+        ext = os.path.splitext(image_path)[1].lower().lstrip(".") or "img"
+        text = caption.encode("utf-8")
+
+        with self.lock:
+            key = f"{self.next_key:09d}"
+            meta = json.dumps({"key": key, "source": image_path, "image_bytes": len(image)},
+                              ensure_ascii=False).encode("utf-8")
+            files = ((f"{key}.{ext}", image), (f"{key}.txt", text), (f"{key}.json", meta))
+            size = sum(member_bytes(len(data)) for _, data in files)
+
+            # 当前分片再写这个样本会超出上限时先换新分片（单个样本超过上限时独占一个分片）
+            if self.tar is not None and self.shard["samples"] and self.shard["bytes"] + size > max_bytes:
+                self._close()
+            if self.tar is None:
+                self._open()
+
+            now = time.time()
+            for name, data in files:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = now
+                info.mode = 0o644
+                self.tar.addfile(info, io.BytesIO(data))
+            self.shard["samples"] += 1
+            self.shard["bytes"] += size
+            self.shard["first_key"] = self.shard["first_key"] or key
+            self.shard["last_key"] = key
+            self.next_key += 1
+        return key
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+
+# 正在写入的分片，按 (输出目录, 前缀) 区分，跨多次执行保持打开；退出时全部收尾
+WRITERS = {}
+WRITERS_LOCK = threading.Lock()
+
+
+def get_writer(output_dir, prefix):
+    key = (os.path.abspath(output_dir), prefix)
+    with WRITERS_LOCK:
+        if key not in WRITERS:
+            WRITERS[key] = ShardWriter(*key)
+        return WRITERS[key]
+
+
+def close_all():
+    with WRITERS_LOCK:
+        writers = list(WRITERS.values())
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_all)
+
+
+class Img8ShardWriter:
+    """
+    把 (图片原始字节, 反推文本, 元数据 json) 顺序写入大小有上限的 WebDataset tar 分片，训练时顺序读大文件，
+    不必再读取成千上万个小 txt 文件
+    输入为列表，可以直接接批量加载节点的路径列表和 llama_cpp_instruct_adv 的 output_list
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "text": ("STRING", {"forceInput": True, "default": ""}),
+                "image_path": ("STRING", {"forceInput": True, "default": ""}),
+                "output_dir": ("STRING", {"default": "", "placeholder": "分片输出文件夹，如：D:/datasets/captioned"}),
+                "prefix": ("STRING", {"default": "shard"}),
+                "max_shard_mb": ("INT", {"default": 1024, "min": 1, "max": 65536, "step": 64}),
+                # 本次执行后立即关闭当前分片。默认不关闭：分片写满 max_shard_mb 才换新的，index 模式逐张写入时
+                # 多张样本也写进同一分片，退出 ComfyUI 时自动收尾；需要马上得到完整分片时再打开
+                "finalize": ("BOOLEAN", {"default": False}),
+            },
+        }
+
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("index_path",)
+    FUNCTION = "write_shards"
+    OUTPUT_NODE = True
+    CATEGORY = "utils"
+
+    def write_shards(self, text, image_path, output_dir, prefix="shard", max_shard_mb=1024, finalize=False):
+        # INPUT_IS_LIST 时每个输入都是列表；长度不同时较短的一方重复最后一项
+        output_dir, prefix, max_shard_mb, finalize = (
+            value[0] if isinstance(value, list) else value for value in (output_dir, prefix, max_shard_mb, finalize)
+        )
+        texts = text if isinstance(text, list) else [text]
+        paths = image_path if isinstance(image_path, list) else [image_path]
+        if not output_dir or not output_dir.strip():
+            raise ValueError("分片输出文件夹不能为空")
+
+        writer = get_writer(output_dir.strip().strip('"'), prefix.strip() or "shard")
+        written = 0
+        for i in range(max(len(texts), len(paths)) if texts and paths else 0):
+            caption, path = texts[min(i, len(texts) - 1)], paths[min(i, len(paths) - 1)]
+            if not caption or not caption.strip():
+                print(f"⚠️ 警告：文本内容为空，跳过 '{path}'")
+                continue
+            if not path or not img8archive.exists(path):
+                print(f"⚠️ 警告：图片路径不存在或为空 '{path}'")
+                continue
+            writer.write(img8archive.normalize(path), caption.strip(), max_shard_mb * 1024 * 1024)
+            written += 1
+        if finalize:
+            writer.close()
+        print(f"📦 [img8] 已写入 {written} 个样本: {writer.output_dir}")
+        return (writer.index_path,)
+
+# 注册节点
+NODE_CLASS_MAPPINGS = {
+    "img8shardwriter": Img8ShardWriter
+}
+
+# 显示名映射
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "img8shardwriter": "📦 img8shardwriter：write image+text tar shards"
+}
@@ -1,9 +1,135 @@
 # 保存为: ComfyUI/custom_nodes/img8txtsaver.py
+import atexit
 import os
-import time
+import queue
+import threading
 from datetime import datetime
+from . import _img8archive as img8archive
+from . import _img8manifest as img8manifest
+
+# 后台写入线程每批最多处理的文件数：同一批先全部写入临时文件，统一 fsync 后再改名
+WRITE_BATCH = 64
+
+
+class CaptionWriter:
+    """
+    后台写文本文件：节点只把 (路径, 内容) 放进队列就返回，网络盘很慢时也不会卡住推理
+    每个文件先写到同目录的临时文件，fsync 后再改名为目标文件，中途出错不会留下半个文件
+    队列清空时打印一次汇总，ComfyUI 退出前等待队列写完
+    带清单记录的文件在改名成功后才写入清单，中断时清单里不会有实际没保存的文本
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.created_dirs = set()  # 已经确认存在的目录，不再重复 makedirs
+        self.saved = 0
+
+    def submit(self, path, text, record=None):
+        """record 为 (清单, 图片路径, 模型键, 提示词键)，不需要记录时为 None"""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="img8txtwriter", daemon=True)
+                self.thread.start()
+        self.queue.put((path, text, record))
+
+    def flush(self):
+        """等待队列中的文件全部写完"""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if self.queue.empty() and self.saved:
+                print(f"✅ 文本已保存: {self.saved} 个文件")
+                self.saved = 0
+
+    def _write_batch(self, batch):
+        # 同一批里写同一个文件的只保留最后一次（临时文件名按目标文件生成，重复的目标会互相覆盖）；
+        # 被覆盖的那几项不写入清单，下次运行会重新反推
+        latest = {path: (path, text, record) for path, text, record in batch}
+        staged = []
+        for path, text, record in latest.values():
+            tmp_path = path + ".img8.tmp"
+            try:
+                directory = os.path.dirname(path)
+                if directory not in self.created_dirs:
+                    os.makedirs(directory, exist_ok=True)
+                    self.created_dirs.add(directory)
+                f = open(tmp_path, 'w', encoding='utf-8')
+            except Exception as e:
+                print(f"❌ 保存失败: {path}: {str(e)}")
+                self.created_dirs.discard(directory)  # 目录可能已被删除，下次重新创建
+                continue
+            try:
+                f.write(text)
+                f.flush()
+            except Exception as e:
+                print(f"❌ 保存失败: {path}: {str(e)}")
+                self._discard(f, tmp_path)
+                continue
+            staged.append((path, text, record, tmp_path, f))
+
+        records = {}  # 清单 -> [(图片路径, 内容指纹, 模型键, 提示词键, 文本), ...]
+        for path, text, record, tmp_path, f in staged:
+            try:
+                os.fsync(f.fileno())
+                f.close()
+                os.replace(tmp_path, path)
+                self.saved += 1
+            except Exception as e:
+                print(f"❌ 保存失败: {path}: {str(e)}")
+                self._discard(f, tmp_path)
+                continue
+            if record is not None:
+                manifest, image_path, model_key, prompt_key = record
+                try:
+                    fingerprint = img8manifest.content_key(image_path)
+                except Exception as e:
+                    print(f"⚠️ 警告：无法计算图片指纹，未写入清单 '{image_path}': {str(e)}")
+                    continue
+                records.setdefault(manifest, []).append((image_path, fingerprint, model_key, prompt_key, text))
+
+        for manifest, entries in records.items():
+            try:
+                manifest.record(entries)
+            except Exception as e:
+                print(f"❌ 写入清单失败: {manifest.path}: {str(e)}")
+
+    @staticmethod
+    def _discard(f, tmp_path):
+        try:
+            f.close()
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+# 全局共用的写入线程，第一次保存时才启动
+WRITER = CaptionWriter()
+atexit.register(WRITER.flush)
+
 
 class Img8TxtSaver:
+    """
+    把反推文本保存为与图片同名的 txt 文件
+    输入为列表：可以直接接 llama_cpp_instruct_adv 的 output_list 和批量加载节点的路径列表，按顺序一一对应；
+    文件由后台线程写入，节点立即返回
+    填写 manifest 时同时把 (图片路径, 内容指纹, 模型键, 提示词键) -> 文本 记入清单，批量加载节点据此跳过已完成的图片
+    模型键取自接入的 llama_model 的配置，提示词键取自接入的提示词，与批量加载节点接同样的来源
+    """
+
     @classmethod
     def INPUT_TYPES(cls):
         return {
@@ -12,58 +138,63 @@ class Img8TxtSaver:
                 "image_path": ("STRING", {"forceInput": True, "default": ""}),
                 "add_timestamp": (["disabled", "enabled"], {"default": "disabled"}),
             },
+            "optional": {
+                # 反推清单文件，为空表示不记录；只写文件名时放在 ComfyUI 的 user 目录
+                "manifest": ("STRING", {"default": ""}),
+                # 接模型加载节点的 llama_model、以及送进 llama_cpp_instruct_adv 的同一个提示词 / 系统提示词，
+                # 与批量加载节点接同样的来源，换模型或提示词后会重新反推
+                "llama_model": ("LLAMACPPMODEL",),
+                "prompt": ("STRING", {"forceInput": True}),
+                "system_prompt": ("STRING", {"forceInput": True}),
+            },
         }
     
+    INPUT_IS_LIST = True
     RETURN_TYPES = ()
     FUNCTION = "save_text"
     OUTPUT_NODE = True
     CATEGORY = "utils"
 
-    def save_text(self, text, image_path, add_timestamp="disabled"):
+    def save_text(self, text, image_path, add_timestamp="disabled", manifest="", llama_model=None, prompt="",
+                  system_prompt=""):
+        # INPUT_IS_LIST 时每个输入都是列表；长度不同时较短的一方重复最后一项（与 ComfyUI 的列表规则一致）
+        texts = text if isinstance(text, list) else [text]
+        paths = image_path if isinstance(image_path, list) else [image_path]
+        add_timestamp, manifest, llama_model, prompt, system_prompt = (
+            value[0] if isinstance(value, list) else value
+            for value in (add_timestamp, manifest, llama_model, prompt, system_prompt)
+        )
+        if not texts or not paths:
+            return ()
+
+        # 生成时间戳：格式为 _YYYYMMDD_HHMMSS，同一批共用
+        timestamp = datetime.now().strftime("_%Y%m%d_%H%M%S") if add_timestamp == "enabled" else ""
+        book = img8manifest.open_manifest(manifest)
+        keys = (img8manifest.model_key(llama_model), img8manifest.prompt_key(prompt, system_prompt))
+
+        for i in range(max(len(texts), len(paths))):
+            self.queue_text(texts[min(i, len(texts) - 1)], paths[min(i, len(paths) - 1)], timestamp, book, keys)
+        return ()
+
+    def queue_text(self, text, image_path, timestamp="", book=None, keys=("", "")):
         # 验证输入
         if not text or not text.strip():
-            print("⚠️ 警告：文本内容为空，不保存文件")
-            return ()
+            print(f"⚠️ 警告：文本内容为空，不保存文件 '{image_path}'")
+            return
         
-        if not image_path or not os.path.exists(image_path):
+        if not image_path or not img8archive.exists(image_path):
             print(f"⚠️ 警告：图片路径不存在或为空 '{image_path}'")
-            return ()
-        
-        # 获取原文件信息
-        dir_path = os.path.dirname(image_path)
-        base_name = os.path.splitext(os.path.basename(image_path))[0]
-        
-        # 构建文件名
-        if add_timestamp == "enabled":
-            # 生成时间戳：格式为 _YYYYMMDD_HHMMSS
-            timestamp = datetime.now().strftime("_%Y%m%d_%H%M%S")
-            txt_filename = f"{base_name}{timestamp}.txt"
-        else:
-            txt_filename = f"{base_name}.txt"
+            return
         
-        # 完整的保存路径
-        txt_path = os.path.join(dir_path, txt_filename)
+        # 获取原文件信息；归档中的图片（"归档::成员"）保存到归档旁边的 <归档名>_captions 文件夹
+        archive, member = img8archive.split_path(image_path)
+        dir_path = img8archive.sidecar_dir(image_path)
+        base_name = os.path.splitext(os.path.basename(member if archive else image_path))[0]
         
-        try:
-            # 确保目录存在
-            os.makedirs(dir_path, exist_ok=True)
-            
-            # 写入文件
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write(text.strip())
-            
-            print(f"✅ 文本已保存到: {txt_path}")
-            
-            # 如果启用了时间戳，也打印原始文件名用于参考
-            if add_timestamp == "enabled":
-                print(f"📝 原始文件名: {base_name}")
-                
-        except Exception as e:
-            print(f"❌ 保存失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
-        
-        return ()
+        # 完整的保存路径，交给后台线程写入
+        txt_path = os.path.join(dir_path, f"{base_name}{timestamp}.txt")
+        record = None if book is None else (book, img8archive.normalize(image_path)) + keys
+        WRITER.submit(txt_path, text.strip(), record)
 
 # 注册节点
 NODE_CLASS_MAPPINGS = {
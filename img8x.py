@@ -1,5 +1,81 @@
 import torch
-import math
+import functools
+import json
+from . import _img8ops as img8ops
+from . import _img8plan as img8plan
+from . import _img8presets as img8presets
+from . import _img8resample as img8resample
+
+# 外扩遮罩模板的缓存容量。外扩循环里同样的 (H, W, x, y, feather) 会反复出现，模板只生成一次
+# 命中/未命中次数可用 outpaint_mask_template.cache_info() 查看
+# 模板本身被缓存共享；每次执行先复制出一份 [1, H, W]，再 expand 成 [B, H, W] 视图输出，
+# 整批共享这一份副本的内存，下游原地修改不会改坏缓存（但仍会影响同一批的其他帧）
+TEMPLATE_CACHE_SIZE = 16
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def outpaint_mask_template(H, W, x, y, orig_w, orig_h, feather, dtype, device):
+    """
+    生成 [1, H, W] 的外扩遮罩：原图区域为0，其余为1，feather > 0 时从原图边缘向外羽化
+    返回的张量被缓存共享，调用方不能原地修改
+    """
+    mask = torch.ones((H, W), dtype=dtype, device=device)
+    # 内部区域为0（原始图像区域）
+    mask[y:y+orig_h, x:x+orig_w] = 0
+    if feather > 0:
+        # 创建羽化遮罩
+        feathered_mask = torch.ones((H, W), dtype=dtype, device=device)
+        # 顶部羽化
+        if y > 0:
+            top_feather_len = min(feather, y)
+            if top_feather_len > 0:
+                top_feather = torch.linspace(1, 0, top_feather_len, device=device, dtype=dtype).view(top_feather_len, 1)
+                top_feather = top_feather.repeat(1, W)
+                feathered_mask[y-top_feather_len:y, :] = top_feather
+        # 底部羽化
+        if y + orig_h < H:
+            bottom_feather_len = min(feather, H - (y + orig_h))
+            if bottom_feather_len > 0:
+                bottom_feather = torch.linspace(0, 1, bottom_feather_len, device=device, dtype=dtype).view(bottom_feather_len, 1)
+                bottom_feather = bottom_feather.repeat(1, W)
+                feathered_mask[y+orig_h:y+orig_h+bottom_feather_len, :] = bottom_feather
+        # 左侧羽化
+        if x > 0:
+            left_feather_len = min(feather, x)
+            if left_feather_len > 0:
+                left_feather = torch.linspace(1, 0, left_feather_len, device=device, dtype=dtype).view(1, left_feather_len)
+                left_feather = left_feather.repeat(H, 1)
+                feathered_mask[:, x-left_feather_len:x] = left_feather
+        # 右侧羽化
+        if x + orig_w < W:
+             right_feather_len = min(feather, W - (x + orig_w))
+             if right_feather_len > 0:
+                right_feather = torch.linspace(0, 1, right_feather_len, device=device, dtype=dtype).view(1, right_feather_len)
+                right_feather = right_feather.repeat(H, 1)
+                feathered_mask[:, x+orig_w:x+orig_w+right_feather_len] = right_feather
+        mask = mask * feathered_mask
+    return mask.unsqueeze(0)
+
+
+def expand_geometry(orig_w, orig_h, max_pixels, multiple):
+    """
+    计算外扩画布的尺寸以及图像在画布中的位置，返回 (W, H, new_w, new_h, x, y)
+    new_w/new_h 为放进画布的图像尺寸，与原尺寸不同时需要先缩放
+    """
+    # 计算原始图像扩展后的尺寸
+    W = img8plan.align_up(orig_w, multiple)
+    H = img8plan.align_up(orig_h, multiple)
+
+    # 检查像素数是否超过限制
+    if W * H > max_pixels:
+        # 取不超过预算的最大对齐尺寸（宽高比最接近原图），向上取整不会再超出 max_pixels
+        new_w, new_h = img8plan.plan_size(orig_w / orig_h, multiple, max_pixels)
+        # 缩放后图像直接适应画布，不需要再扩展
+        return new_w, new_h, new_w, new_h, 0, 0
+
+    # 原图居中放置
+    return W, H, orig_w, orig_h, (W - orig_w) // 2, (H - orig_h) // 2
+
 
 class img8x:
     """
@@ -16,6 +92,10 @@ class img8x:
             },
             "optional": {
                 "mask_opt": ("MASK",),  # 新增可选遮罩输入
+                # 缩放算法，auto 按缩放比例选择（放大 bicubic，缩小 lanczos），均带抗锯齿
+                "scale_method": (["auto"] + list(img8resample.RESAMPLE_METHODS), {"default": "auto"}),
+                # 可选的模型分辨率预设（与 imgx8e 共用预设表），选中后覆盖 max_pixels（预设的宽×高）
+                "preset": (["none"] + img8presets.REGISTRY.choices(), {"default": "none"}),
             }
         }
     # 修改 RETURN_TYPES，添加 INT 类型用于输出 x 和 y 坐标
@@ -25,150 +105,155 @@ class img8x:
     FUNCTION = "expand_image"
     CATEGORY = "image"
 
-    def expand_image(self, image, feather, max_pixels, multiple, mask_opt=None):
+    def expand_image(self, image, feather, max_pixels, multiple, mask_opt=None, scale_method="auto", preset="none"):
+        record = img8presets.REGISTRY.lookup(preset)
+        if record is not None:
+            max_pixels = record.width * record.height
+
         # 第一步：获取原始图像尺寸
         batch_size, orig_h, orig_w, channels = image.shape
         orig_w, orig_h = int(orig_w), int(orig_h)
-        
-        # 计算满足指定倍数的目标尺寸
-        def round_to_multiple(x, mult):
-            return ((x + mult - 1) // mult) * mult
-            
-        # 计算原始图像扩展后的尺寸 (使用新的 multiple 参数)
-        W = round_to_multiple(orig_w, multiple)
-        H = round_to_multiple(orig_h, multiple)
-        
-        # 初始化缩放标志和坐标
-        was_resized = False
-        x, y = 0, 0 # 初始化 x, y 坐标
-        
-        # 第二步：检查像素数是否超过限制
-        if W * H > max_pixels:
-            was_resized = True
-            # 计算缩放比例
-            scale_factor = math.sqrt(max_pixels / (W * H))
-            # 计算缩放后的尺寸（保持宽高比）
-            new_w = max(multiple, int(orig_w * scale_factor))
-            new_h = max(multiple, int(orig_h * scale_factor))
-            # 确保缩放后尺寸是指定倍数
-            new_w = round_to_multiple(new_w, multiple)
-            new_h = round_to_multiple(new_h, multiple)
-            # 使用双线性插值缩放图像
-            image_permuted = image.permute(0, 3, 1, 2)  # [B, C, H, W]
-            scaled_image = torch.nn.functional.interpolate(
-                image_permuted,
-                size=(new_h, new_w),
-                mode='bilinear',
-                align_corners=False
-            )
-            image = scaled_image.permute(0, 2, 3, 1)  # 恢复为 [B, H, W, C]
+
+        # 第二、三步：计算画布尺寸；像素数超过限制时先缩放，缩放后图像直接适应画布
+        W, H, new_w, new_h, x, y = expand_geometry(orig_w, orig_h, max_pixels, multiple)
+        if (new_w, new_h) != (orig_w, orig_h):
+            # 带抗锯齿地缩放整批图像
+            image = img8resample.resize(image, new_h, new_w, scale_method)
             # 如果有输入遮罩，同样缩放遮罩
             if mask_opt is not None:
-                # 处理遮罩维度 (可能为2D或3D)
-                if mask_opt.dim() == 2:
-                    mask_opt = mask_opt.unsqueeze(0).unsqueeze(0)  # [1, 1, H, W]
-                elif mask_opt.dim() == 3:
-                    mask_opt = mask_opt.unsqueeze(1)  # [B, 1, H, W]
-                scaled_mask = torch.nn.functional.interpolate(
-                    mask_opt,
-                    size=(new_h, new_w),
-                    mode='bilinear',
-                    align_corners=False
-                )
-                # 恢复原始维度
-                if scaled_mask.size(1) == 1:
-                    scaled_mask = scaled_mask.squeeze(1)  # [B, H, W]
-                mask_opt = scaled_mask
+                # 处理遮罩维度 (可能为2D或3D)，统一为 [B, H, W]
+                mask_opt = img8ops.as_mask_batch(mask_opt)
+                mask_opt = img8resample.resize(mask_opt, new_h, new_w, scale_method).clamp(0.0, 1.0)
             # 更新尺寸信息
             orig_w, orig_h = new_w, new_h
-            W, H = new_w, new_h  # 缩放后不需要再扩展
-            
-        # 第三步：计算填充量（仅当未缩放时）
-        if not was_resized and (W > orig_w or H > orig_h):
-            x = (W - orig_w) // 2
-            y = (H - orig_h) // 2
-            
-        # 如果缩放了，则 x, y 保持为 0，因为图像直接适应目标尺寸 (实际上，这里 x, y 会被重新计算为 (W - new_w)//2, (H - new_h)//2)
-        # 重新计算 x, y 以适应最终的 H, W 和当前的 orig_h, orig_w (这实际上是缩放后或原始对齐后的尺寸)
-        x = (W - orig_w) // 2
-        y = (H - orig_h) // 2
-        
-        # 第四步：创建新图像
-        new_image = torch.zeros((batch_size, H, W, channels), dtype=image.dtype, device=image.device)
-        
-        # 第五步：将原始图像（或缩放后的图像）放置到新图像指定位置
-        new_image[:, y:y+orig_h, x:x+orig_w, :] = image
-        
-        # 第六步：创建遮罩
-        mask = torch.ones((batch_size, H, W), dtype=torch.float32, device=image.device)
-        # 内部区域为0（原始图像区域）
-        mask[:, y:y+orig_h, x:x+orig_w] = 0
+
+        # 第四、五步：创建新图像，并将原始图像（或缩放后的图像）放置到指定位置
+        new_image = img8ops.place(image, H, W, x, y)
         
+        # 第六步：创建外扩遮罩（含羽化），每帧都相同，模板按几何参数缓存，复制一份后以 [1, H, W] 视图广播到整批
+        template = outpaint_mask_template(H, W, x, y, orig_w, orig_h, feather, torch.float32, image.device)
+        mask = template.clone().expand(batch_size, -1, -1)
+
         # 处理输入遮罩（如果有）
-        processed_mask = torch.zeros((batch_size, H, W), dtype=torch.float32, device=image.device)
-        if mask_opt is not None:
-            # 确保遮罩维度正确
-            if mask_opt.dim() == 2:
-                mask_opt = mask_opt.unsqueeze(0)  # [1, H, W]
-            elif mask_opt.dim() == 3:
-                # 检查批次大小是否匹配
-                if mask_opt.size(0) != batch_size:
-                    # 如果批次不匹配，取前 batch_size 个或复制第一个（取决于具体情况，这里假设输入批次是1或匹配的）
-                    if mask_opt.size(0) == 1:
-                         mask_opt = mask_opt.repeat(batch_size, 1, 1)
-                    else:
-                         mask_opt = mask_opt[:batch_size] # 截取匹配的批次
-            # --- 修改开始 ---
-            # 获取当前 mask_opt 的实际高度和宽度（可能已缩放）
-            mask_h, mask_w = mask_opt.shape[-2], mask_opt.shape[-1]
-            # 将 mask_opt 放置到 processed_mask 的对应位置 [y, y+mask_h, x, x+mask_w]
-            # 这里的 y, x 是根据最终尺寸 H, W 和当前 mask_opt 的尺寸计算得出的偏移
-            processed_mask[:, y:y+mask_h, x:x+mask_w] = mask_opt[:, :mask_h, :mask_w] # 使用 mask_h, mask_w 索引
-            # --- 修改结束 ---
-            
-        # 应用羽化
-        if feather > 0:
-            # 创建羽化遮罩
-            feathered_mask = torch.ones((H, W), dtype=torch.float32, device=image.device)
-            # 顶部羽化
-            if y > 0:
-                top_feather_len = min(feather, y)
-                if top_feather_len > 0:
-                    top_feather = torch.linspace(1, 0, top_feather_len, device=feathered_mask.device).view(top_feather_len, 1)
-                    top_feather = top_feather.repeat(1, W)
-                    feathered_mask[y-top_feather_len:y, :] = top_feather
-            # 底部羽化
-            if y + orig_h < H:
-                bottom_feather_len = min(feather, H - (y + orig_h))
-                if bottom_feather_len > 0:
-                    bottom_feather = torch.linspace(0, 1, bottom_feather_len, device=feathered_mask.device).view(bottom_feather_len, 1)
-                    bottom_feather = bottom_feather.repeat(1, W)
-                    feathered_mask[y+orig_h:y+orig_h+bottom_feather_len, :] = bottom_feather
-            # 左侧羽化
-            if x > 0:
-                left_feather_len = min(feather, x)
-                if left_feather_len > 0:
-                    left_feather = torch.linspace(1, 0, left_feather_len, device=feathered_mask.device).view(1, left_feather_len)
-                    left_feather = left_feather.repeat(H, 1)
-                    feathered_mask[:, x-left_feather_len:x] = left_feather
-            # 右侧羽化
-            if x + orig_w < W:
-                 right_feather_len = min(feather, W - (x + orig_w))
-                 if right_feather_len > 0:
-                    right_feather = torch.linspace(0, 1, right_feather_len, device=feathered_mask.device).view(1, right_feather_len)
-                    right_feather = right_feather.repeat(H, 1)
-                    feathered_mask[:, x+orig_w:x+orig_w+right_feather_len] = right_feather
-            # 应用羽化到所有批次
-            mask = mask * feathered_mask.unsqueeze(0) # [1, H, W] * [1, H, W] -> [1, H, W], 然后广播到 [B, H, W]
-            
+        if mask_opt is None:
+            # 没有需要放置的遮罩，只分配一帧全0遮罩并广播到整批
+            processed_mask = torch.zeros((1, H, W), dtype=torch.float32, device=image.device).expand(batch_size, -1, -1)
+        else:
+            # 确保遮罩维度正确，统一为 [B, H, W]
+            mask_opt = img8ops.as_mask_batch(mask_opt)
+            if mask_opt.size(0) > batch_size:
+                mask_opt = mask_opt[:batch_size]  # 截取匹配的批次
+            # 将 mask_opt（可能已缩放）放置到 processed_mask 的 (x, y) 位置，超出画布的部分被裁掉
+            processed_mask = img8ops.place(mask_opt.to(device=image.device, dtype=torch.float32), H, W, x, y)
+            if processed_mask.size(0) == 1:
+                # 单张遮罩只放置一次，再以视图广播到整批
+                processed_mask = processed_mask.expand(batch_size, -1, -1)
+
         # 返回新图像、遮罩、处理后的遮罩以及原始图像在新图像中的坐标 x, y
         return (new_image, mask, processed_mask, x, y)
 
+class img8xBucket:
+    """
+    img8x 的列表输入版本：尺寸各异的图片按外扩后的画布尺寸分桶，
+    同一个桶里的图片整批缩放、放置，输出每个桶一个批次，并附带图片到桶的对应关系
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return img8x.INPUT_TYPES()
+
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ("IMAGE", "MASK", "MASK", "STRING")
+    RETURN_NAMES = ("images", "outpaint_masks", "processed_masks", "bucket_map")
+    OUTPUT_IS_LIST = (True, True, True, False)
+    FUNCTION = "expand_list"
+    CATEGORY = "image"
+
+    def expand_list(self, image, feather, max_pixels, multiple, mask_opt=None, scale_method=None, preset=None):
+        # 列表输入时每个参数都是列表，标量参数取第一个
+        feather, max_pixels, multiple = feather[0], max_pixels[0], multiple[0]
+        scale_method = scale_method[0] if scale_method else "auto"
+        record = img8presets.REGISTRY.lookup(preset[0]) if preset else None
+        if record is not None:
+            max_pixels = record.width * record.height
+
+        # 把所有输入批次展开成单帧 [1, H, W, C]
+        frames = [img[b:b + 1] for img in image for b in range(img.shape[0])]
+        masks = None
+        if mask_opt:
+            masks = [m[b:b + 1] for m in map(img8ops.as_mask_batch, mask_opt) for b in range(m.shape[0])]
+            if len(masks) == 1:
+                masks = masks * len(frames)  # 单张遮罩用于所有图片
+            elif len(masks) != len(frames):
+                raise ValueError(f"遮罩数量({len(masks)})与图片数量({len(frames)})不一致")
+
+        # 按 (画布宽, 画布高, 通道数) 分桶，桶的顺序与图片第一次出现的顺序一致
+        geometries = []
+        buckets = {}
+        for i, frame in enumerate(frames):
+            geometry = expand_geometry(int(frame.shape[2]), int(frame.shape[1]), max_pixels, multiple)
+            geometries.append(geometry)
+            buckets.setdefault((geometry[0], geometry[1], frame.shape[3]), []).append(i)
+
+        images_out, masks_out, processed_out = [], [], []
+        items = [None] * len(frames)
+        for bucket_index, ((W, H, channels), indices) in enumerate(buckets.items()):
+            first = frames[indices[0]]
+            canvas = first.new_zeros((len(indices), H, W, channels))
+            processed = None
+            if masks is not None:
+                processed = torch.zeros((len(indices), H, W), dtype=torch.float32, device=first.device)
+
+            # 桶内源尺寸与放置位置都相同的图片一起缩放，再写入各自的槽位
+            groups = {}
+            for slot, i in enumerate(indices):
+                key = (frames[i].shape[1], frames[i].shape[2]) + geometries[i][2:]
+                groups.setdefault(key, []).append(slot)
+                items[i] = {"bucket": bucket_index, "slot": slot, "x": geometries[i][4], "y": geometries[i][5]}
+
+            templates = []
+            for (src_h, src_w, new_w, new_h, x, y), slots in groups.items():
+                batch = torch.cat([frames[indices[slot]].to(first.device) for slot in slots])
+                batch = img8resample.resize(batch, new_h, new_w, scale_method)
+                canvas[slots, y:y + new_h, x:x + new_w] = batch.to(canvas.dtype)
+                if processed is not None:
+                    group_masks = torch.cat([masks[indices[slot]].to(first.device, torch.float32) for slot in slots])
+                    if tuple(group_masks.shape[1:]) != (new_h, new_w):
+                        group_masks = img8resample.resize(group_masks, new_h, new_w, scale_method).clamp(0.0, 1.0)
+                    processed[slots, y:y + new_h, x:x + new_w] = group_masks
+                templates.append(
+                    (slots, outpaint_mask_template(H, W, x, y, new_w, new_h, feather, torch.float32, first.device))
+                )
+
+            # 外扩遮罩：整个桶几何参数相同时复制一份模板并广播，否则逐槽位拼接
+            if len(templates) == 1:
+                outpaint = templates[0][1].clone().expand(len(indices), -1, -1)
+            else:
+                outpaint = torch.empty((len(indices), H, W), dtype=torch.float32, device=first.device)
+                for slots, template in templates:
+                    outpaint[slots] = template
+            if processed is None:
+                processed = torch.zeros((1, H, W), dtype=torch.float32, device=first.device).expand(len(indices), -1, -1)
+
+            images_out.append(canvas)
+            masks_out.append(outpaint)
+            processed_out.append(processed)
+
+        bucket_map = json.dumps({
+            "buckets": [
+                {"width": W, "height": H, "count": len(indices)} for (W, H, _), indices in buckets.items()
+            ],
+            "items": items,
+        }, ensure_ascii=False)
+        print(f"img8x 分桶: {len(frames)} 张图片 -> {len(buckets)} 个批次")
+        return (images_out, masks_out, processed_out, bucket_map)
+
 # 注册节点
 NODE_CLASS_MAPPINGS = {
-    "img8x": img8x
+    "img8x": img8x,
+    "img8xBucket": img8xBucket
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "img8x": "img8x"
+    "img8x": "img8x",
+    "img8xBucket": "img8x (Bucket List)"
 }
@@ -188,6 +188,15 @@ class llama_cpp_chat:
             LLAMA_CPP_STORAGE = real_storage
             print("[llama-cpp-chat] Using real storage instance")
         
+        # 模型池：loader 输出的句柄指向池中的具体模型，先取出它（被淘汰时会重新加载），
+        # 这样 LLAMA_CPP_STORAGE.llm 就是这个节点连接的模型，而不是最近使用的另一个
+        handle_llm = None
+        if not isinstance(llama_model, dict) and hasattr(llama_model, 'llm'):
+            try:
+                handle_llm = llama_model.llm
+            except Exception as e:
+                print(f"[llama-cpp-chat] WARNING: Could not acquire model from handle: {e}")
+        
         # 检查模型是否已加载
         if LLAMA_CPP_STORAGE is None or LLAMA_CPP_STORAGE.llm is None:
             print("[llama-cpp-chat] WARNING: LLAMA_CPP_STORAGE.llm is None")
@@ -298,7 +307,8 @@ class llama_cpp_chat:
                     raise RuntimeError("No valid LLM instance found")
             
             # 使用导入的共享类的 llm 实例
-            output = LLAMA_CPP_STORAGE.llm.create_chat_completion(
+            llm = handle_llm if handle_llm is not None else LLAMA_CPP_STORAGE.llm
+            output = llm.create_chat_completion(
                 messages=messages,
                 seed=seed,
                 **_parameters
@@ -327,7 +337,9 @@ class llama_cpp_chat:
         
         if force_offload:
             print("[llama-cpp-chat] Force offloading model...")
-            if hasattr(LLAMA_CPP_STORAGE, 'clean'):
+            if handle_llm is not None and hasattr(llama_model, 'clean'):
+                llama_model.clean()
+            elif hasattr(LLAMA_CPP_STORAGE, 'clean'):
                 LLAMA_CPP_STORAGE.clean()
         
         return (response,)
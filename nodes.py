@@ -1,7 +1,15 @@
 import os
 import io
 import gc
+import copy
 import json
+import queue
+import pickle
+import hashlib
+import tempfile
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import base64
 import random
 import torch
@@ -15,6 +23,11 @@ import folder_paths
 import comfy.model_management as mm
 import comfy.utils
 from llama_cpp import Llama
+try:
+    from llama_cpp import llama_supports_gpu_offload
+except ImportError:
+    def llama_supports_gpu_offload():
+        return False
 from llama_cpp.llama_chat_format import (
     Llava15ChatHandler, Llava16ChatHandler, MoondreamChatHandler,
     NanoLlavaChatHandler, Llama3VisionAlphaChatHandler, MiniCPMv26ChatHandler
@@ -58,12 +71,246 @@ class AnyType(str):
     def __ne__(self, __value: object) -> bool:
         return False
 
+class LLAMA_CPP_MODEL:
+    """模型池中的一项：已加载的 Llama、对应的 chat_handler、配置和估计的内存占用（GB）"""
+    def __init__(self, config, llm, chat_handler, size_gb):
+        self.config = config
+        self.llm = llm
+        self.chat_handler = chat_handler
+        self.size_gb = size_gb
+        # 并行推理用的专用实例 [(llm, chat_handler, n_threads, 估计占用 GB)]，与主实例共享 mmap 的权重文件
+        self.workers = []
+
+    @staticmethod
+    def close_instance(llm, chat_handler):
+        try:
+            llm.close()
+        except Exception:
+            pass
+        try:
+            chat_handler._exit_stack.close()
+        except Exception:
+            pass
+
+    def close(self):
+        self.close_instance(self.llm, self.chat_handler)
+        for llm, chat_handler, _, _ in self.workers:
+            self.close_instance(llm, chat_handler)
+        self.llm = None
+        self.chat_handler = None
+        self.workers = []
+
+class LLAMA_CPP_HANDLE:
+    """
+    llama_cpp_model_loader 的输出：指向池中某个配置的句柄。
+    每次访问 llm / chat_handler 时从池中取出该模型（已被淘汰则重新加载）并记为最近使用，
+    交替使用多个模型时不必每次重新加载。
+    """
+    def __init__(self, config):
+        self.config = config.copy()
+        self.key = LLAMA_CPP_STORAGE.config_key(config)
+
+    @property
+    def llm(self):
+        return LLAMA_CPP_STORAGE.acquire(self.config).llm
+
+    @property
+    def chat_handler(self):
+        return LLAMA_CPP_STORAGE.acquire(self.config).chat_handler
+
+    @property
+    def messages(self):
+        return LLAMA_CPP_STORAGE.messages
+
+    @property
+    def sys_prompts(self):
+        return LLAMA_CPP_STORAGE.sys_prompts
+
+    def clean_state(self, id=-1):
+        LLAMA_CPP_STORAGE.clean_state(id)
+
+    def clean(self, all=False):
+        # 只卸载这个模型，池中的其他模型保留
+        LLAMA_CPP_STORAGE.evict(self.key)
+        if all:
+            LLAMA_CPP_STORAGE.clean_state()
+
+class LLAMA_CPP_PREFIX_CACHE:
+    # 🔹 公共前缀（系统提示词 + 预设提示词）的 KV 快照缓存。
+    # 多模态 chat_handler 每次推理都会清空上下文、从头计算提示词；这里在清空后、第一张图片之前的那段文本算完时
+    # 保存 llama 状态，之后遇到相同前缀（同一模型配置、相同 token）直接载入快照，只需计算图片和后面的部分。
+    # 只在 chat_completion 包装的多模态推理中生效，纯文本提示词和 llamachat 等其他调用不受影响。
+    # 快照不保存完整的 scores（n_tokens × 词表大小，可达数百 MB），只保留最后一行，载入时再还原形状。
+    # 快照保存在内存 LRU 中（上限 LLAMA_CPP_PREFIX_CACHE_MB），ram+disk 模式下同时写入磁盘，
+    # 磁盘上的快照超过 LLAMA_CPP_PREFIX_CACHE_DISK_MB 时按修改时间删除最久未用的
+    min_tokens = 64
+    budget_bytes = int(os.environ.get("LLAMA_CPP_PREFIX_CACHE_MB", 1024)) * 1024 * 1024
+    disk_budget_bytes = int(os.environ.get("LLAMA_CPP_PREFIX_CACHE_DISK_MB", 4096)) * 1024 * 1024
+    states = collections.OrderedDict()  # 键 -> (精简后的快照, 字节数)
+    total_bytes = 0
+    lock = threading.Lock()
+
+    @staticmethod
+    def make_key(config_key, tokens):
+        m = hashlib.sha256(config_key.encode("utf-8"))
+        m.update(np.asarray(tokens, dtype=np.int32).tobytes())
+        return m.hexdigest()
+
+    @staticmethod
+    def disk_dir():
+        if hasattr(folder_paths, "get_user_directory"):
+            return os.path.join(folder_paths.get_user_directory(), "llama_prefix_cache")
+        return os.path.join(tempfile.gettempdir(), "llama_prefix_cache")
+
+    @staticmethod
+    def compact(state):
+        """去掉 scores 中用不到的行：前缀之后还要计算图片和文本，只有最后一行 logits 可能被用到"""
+        scores = np.asarray(state.scores)
+        compacted = copy.copy(state)
+        if scores.ndim == 2 and scores.shape[0] > 1:
+            row = min(max(int(state.n_tokens) - 1, 0), scores.shape[0] - 1)
+            compacted.scores = scores[row:row + 1].copy()
+            return {"state": compacted, "scores_shape": scores.shape, "scores_row": row}
+        return {"state": compacted, "scores_shape": None, "scores_row": 0}
+
+    @staticmethod
+    def expand(entry):
+        """还原 load_state 需要的 scores 形状，其余行为 0"""
+        state = entry["state"]
+        if entry["scores_shape"] is None:
+            return state
+        scores = np.zeros(entry["scores_shape"], dtype=state.scores.dtype)
+        scores[entry["scores_row"]] = state.scores[0]
+        restored = copy.copy(state)
+        restored.scores = scores
+        return restored
+
+    @classmethod
+    def get(cls, key, mode):
+        with cls.lock:
+            item = cls.states.get(key)
+            if item is not None:
+                cls.states.move_to_end(key)
+                return cls.expand(item[0])
+        if mode != "ram+disk":
+            return None
+        path = os.path.join(cls.disk_dir(), f"{key}.pkl")
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            os.utime(path)  # 记为最近使用，磁盘超出上限时最后删除
+        except Exception:
+            return None
+        cls._remember(key, entry)
+        return cls.expand(entry)
+
+    @classmethod
+    def put(cls, key, state, mode):
+        entry = cls.compact(state)
+        cls._remember(key, entry)
+        if mode != "ram+disk":
+            return
+        directory = cls.disk_dir()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, os.path.join(directory, f"{key}.pkl"))
+            cls._trim_disk(directory)
+        except Exception as e:
+            print(f"[llama-cpp_vlm] Failed to save prefix cache: {e}")
+
+    @classmethod
+    def _trim_disk(cls, directory):
+        """磁盘上的快照总大小超过 disk_budget_bytes 时，按修改时间从旧到新删除"""
+        files = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".pkl") and entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= cls.disk_budget_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    @classmethod
+    def _remember(cls, key, entry):
+        state = entry["state"]
+        size = int(getattr(state, "llama_state_size", 0)) + state.scores.nbytes + state.input_ids.nbytes
+        with cls.lock:
+            old = cls.states.pop(key, None)
+            if old is not None:
+                cls.total_bytes -= old[1]
+            if size > cls.budget_bytes:
+                return
+            cls.states[key] = (entry, size)
+            cls.total_bytes += size
+            while cls.total_bytes > cls.budget_bytes:
+                _, (_, evicted) = cls.states.popitem(last=False)
+                cls.total_bytes -= evicted
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.states.clear()
+            cls.total_bytes = 0
+
+    @staticmethod
+    def chat_completion(llm, mode, **kwargs):
+        """
+        带图片的 create_chat_completion：只在这一次调用中对该 llm 实例启用前缀快照，
+        模式记在实例上而不是全局，并行的各实例、其他节点的调用互不影响
+        """
+        llm.prefix_cache_mode = mode
+        try:
+            return llm.create_chat_completion(**kwargs)
+        finally:
+            llm.prefix_cache_mode = "off"
+
+    @classmethod
+    def install(cls, llm, config_key):
+        """包装 llm.eval：启用时上下文清空后的第一段 token（第一张图片之前的文本）先查快照，命中则直接载入状态"""
+        original_eval = llm.eval
+        llm.prefix_cache_mode = "off"
+
+        def eval(tokens):
+            mode = llm.prefix_cache_mode
+            if mode == "off" or llm.n_tokens != 0:
+                return original_eval(tokens)
+            llm.prefix_cache_mode = "off"  # 只处理第一段，图片之后的文本照常计算
+            if len(tokens) < cls.min_tokens:
+                return original_eval(tokens)
+            key = cls.make_key(config_key, tokens)
+            state = cls.get(key, mode)
+            if state is not None:
+                llm.load_state(state)
+                return
+            original_eval(tokens)
+            cls.put(key, llm.save_state(), mode)
+
+        llm.eval = eval
+
 class LLAMA_CPP_STORAGE:
+    # 🔹 模型池：按配置保存多个已加载的模型，估计的总占用超过 pool_budget_gb 时卸载最久未用的
+    # pool_budget_gb 为 0 时只保留一个模型（与原来的行为一致），默认值可用环境变量 LLAMA_CPP_POOL_GB 设置
+    # llm / chat_handler / current_config 始终指向最近使用的模型，兼容直接读取这几个属性的节点
     llm = None
     chat_handler = None
     current_config = None
     messages = {}
     sys_prompts = {}
+    pool = collections.OrderedDict()
+    pool_budget_gb = float(os.environ.get("LLAMA_CPP_POOL_GB", 0))
+
+    @staticmethod
+    def config_key(config):
+        return json.dumps(config, sort_keys=True, ensure_ascii=False)
 
     @classmethod
     def clean_state(cls, id=-1):
@@ -74,26 +321,120 @@ class LLAMA_CPP_STORAGE:
             cls.messages.pop(f"{id}", None)
             cls.sys_prompts.pop(f"{id}", None)
     
+    @classmethod
+    def _set_current(cls, entry):
+        cls.llm = entry.llm if entry else None
+        cls.chat_handler = entry.chat_handler if entry else None
+        cls.current_config = entry.config.copy() if entry else None
+
+    @classmethod
+    def evict(cls, key):
+        entry = cls.pool.pop(key, None)
+        if entry is None:
+            return
+        print(f"[llama-cpp_vlm] Unloading model: {entry.config['model']}")
+        entry.close()
+        cls._set_current(next(reversed(cls.pool.values()), None))
+        gc.collect()
+        mm.soft_empty_cache()
+
     @classmethod
     def clean(cls, all=False):
-        try:
-            cls.llm.close()
-        except Exception:
-            pass
-        try:
-            cls.chat_handler._exit_stack.close()
-        except Exception:
-            pass
-        cls.llm = None
-        cls.chat_handler = None
-        cls.current_config = None
+        for entry in cls.pool.values():
+            entry.close()
+        cls.pool.clear()
+        cls._set_current(None)
         if all:
             cls.clean_state()
+            LLAMA_CPP_PREFIX_CACHE.clear()
         gc.collect()
         mm.soft_empty_cache()
 
+    @classmethod
+    def acquire(cls, config):
+        """取出配置对应的模型，不在池中时加载；记为最近使用"""
+        key = cls.config_key(config)
+        entry = cls.pool.get(key)
+        if entry is None:
+            # 按文件大小估计占用，先卸载最久未用的模型直到放得下
+            size_gb = cls.estimate_size_gb(config)
+            cls.make_room(size_gb)
+            entry = LLAMA_CPP_MODEL(config.copy(), *cls._load(config), size_gb)
+            cls.pool[key] = entry
+        else:
+            cls.pool.move_to_end(key)
+        cls._set_current(entry)
+        return entry
+
     @classmethod
     def load_model(cls, config):
+        return cls.acquire(config)
+
+    @classmethod
+    def make_room(cls, size_gb, keep=None):
+        """卸载最久未用的模型（keep 除外），直到再加上 size_gb 也不超出预算；预算为 0 时只保留 keep"""
+        while True:
+            others = [key for key in cls.pool if key != keep]
+            if not others:
+                return
+            total = sum(entry.size_gb for entry in cls.pool.values())
+            if cls.pool_budget_gb > 0 and total + size_gb <= cls.pool_budget_gb:
+                return
+            cls.evict(others[0])
+
+    @classmethod
+    def get_workers(cls, config, count):
+        """
+        🔹 并行推理用的 count 个专用模型实例，按相同配置加载，每个实例的线程数为 CPU 核数 / count，合计不超过核数。
+        池中的主实例使用默认线程数，不参与并行，否则会与各实例抢占 CPU。
+        每个实例另占自己的 mmproj 和上下文内存（GPU 上还有一份权重），计入该模型的占用，加载前先按预算卸载其他模型；
+        parallel 调小或线程划分变化时关闭多余 / 不匹配的实例
+        """
+        key = cls.config_key(config)
+        entry = cls.acquire(config)
+        n_threads = max(1, (os.cpu_count() or 1) // count)
+        keep = [worker for worker in entry.workers if worker[2] == n_threads][:count]
+        for worker in entry.workers:
+            if not any(worker is kept for kept in keep):
+                LLAMA_CPP_MODEL.close_instance(worker[0], worker[1])
+                entry.size_gb -= worker[3]
+        entry.workers = keep
+        if len(entry.workers) < count:
+            worker_gb = cls.estimate_worker_gb(config)
+            cls.make_room((count - len(entry.workers)) * worker_gb, keep=key)
+            while len(entry.workers) < count:
+                print(f"[llama-cpp_vlm] Loading worker {len(entry.workers) + 1}/{count} (n_threads = {n_threads})")
+                llm, chat_handler = cls._load(config, n_threads=n_threads)
+                entry.workers.append((llm, chat_handler, n_threads, worker_gb))
+                entry.size_gb += worker_gb
+            if cls.pool_budget_gb > 0 and entry.size_gb > cls.pool_budget_gb:
+                print(f"[llama-cpp_vlm] Warning: estimated {entry.size_gb:.1f} GB with {count} workers exceeds pool_budget_gb = {cls.pool_budget_gb}")
+        return [llm for llm, _, _, _ in entry.workers]
+
+    @staticmethod
+    def estimate_size_gb(config):
+        size_gb = os.path.getsize(os.path.join(folder_paths.models_dir, 'LLM', config["model"])) * 1.55 / (1024 ** 3)
+        if config["mmproj"] and config["mmproj"] != "None":
+            size_gb += os.path.getsize(os.path.join(folder_paths.models_dir, 'LLM', config["mmproj"])) * 1.55 / (1024 ** 3)
+        return size_gb
+
+    @staticmethod
+    def estimate_worker_gb(config):
+        """
+        一个并行实例的额外占用：自己的 mmproj、KV 缓存（按每层每个 token 4 KB 估计，即 GQA 后 1024 维的 f16 K/V），
+        支持 GPU 卸载时还要在显存中再放一份权重
+        """
+        model_path = os.path.join(folder_paths.models_dir, 'LLM', config["model"])
+        model_gb = os.path.getsize(model_path) * 1.55 / (1024 ** 3)
+        size_gb = config["n_ctx"] * (get_layer_count(model_path) or 32) * 4096 / (1024 ** 3)
+        if config["mmproj"] and config["mmproj"] != "None":
+            size_gb += os.path.getsize(os.path.join(folder_paths.models_dir, 'LLM', config["mmproj"])) * 1.55 / (1024 ** 3)
+        if llama_supports_gpu_offload():
+            size_gb += model_gb if config["vram_limit"] == -1 else min(config["vram_limit"], model_gb)
+        return size_gb
+
+    @classmethod
+    def _load(cls, config, n_threads=None):
         def get_chat_handler(chat_handler):
             match chat_handler:
                 # 🔹 新增：Qwen3.5-VL 匹配
@@ -132,8 +473,6 @@ class LLAMA_CPP_STORAGE:
                 case _:
                     raise ValueError(f'Unknow model type: "{chat_handler}"')
         
-        cls.clean(all=True)
-        cls.current_config = config.copy()
         model = config["model"]
         mmproj = config["mmproj"]
         chat_handler = config["chat_handler"]
@@ -145,6 +484,7 @@ class LLAMA_CPP_STORAGE:
         
         model_path = os.path.join(folder_paths.models_dir, 'LLM', model)
         handler = get_chat_handler(chat_handler)
+        chat_handler_obj = None
         
         if vram_limit != -1:
             gguf_layers = get_layer_count(model_path) or 32
@@ -166,37 +506,40 @@ class LLAMA_CPP_STORAGE:
                 # 🔹 修改：Qwen3.5 使用 in 判断 thinking 模式。
                 think_mode = chat_handler in ["Qwen3-VL-Thinking", "Qwen3.5-VL-Thinking"]
                 try:
-                    cls.chat_handler = handler(
+                    chat_handler_obj = handler(
                         clip_model_path=mmproj_path,
                         image_max_tokens=image_max_tokens,
                         image_min_tokens=image_min_tokens,
                         verbose=False)
                     # 🔹 新增：Qwen3.5 通过 extra_template_arguments 注入 thinking 模式
-                    if handler == Qwen35ChatHandler and hasattr(cls.chat_handler, 'extra_template_arguments'):
-                        cls.chat_handler.extra_template_arguments["enable_thinking"] = think_mode
+                    if handler == Qwen35ChatHandler and hasattr(chat_handler_obj, 'extra_template_arguments'):
+                        chat_handler_obj.extra_template_arguments["enable_thinking"] = think_mode
                 except Exception as e:
                     if image_max_tokens > 0 or image_min_tokens > 0:
                         raise ValueError('"image_min_tokens" and "image_max_tokens" are unavailable! Please update llama-cpp-python.')
                     else:
                         try:
-                            cls.chat_handler = handler(clip_model_path=mmproj_path, verbose=False)
-                            if handler == Qwen35ChatHandler and hasattr(cls.chat_handler, 'extra_template_arguments'):
-                                cls.chat_handler.extra_template_arguments["enable_thinking"] = think_mode
+                            chat_handler_obj = handler(clip_model_path=mmproj_path, verbose=False)
+                            if handler == Qwen35ChatHandler and hasattr(chat_handler_obj, 'extra_template_arguments'):
+                                chat_handler_obj.extra_template_arguments["enable_thinking"] = think_mode
                         except Exception as e:
-                            cls.chat_handler = handler(clip_model_path=mmproj_path, verbose=False)
-                            if handler == Qwen35ChatHandler and hasattr(cls.chat_handler, 'extra_template_arguments'):
-                                cls.chat_handler.extra_template_arguments["enable_thinking"] = think_mode
+                            chat_handler_obj = handler(clip_model_path=mmproj_path, verbose=False)
+                            if handler == Qwen35ChatHandler and hasattr(chat_handler_obj, 'extra_template_arguments'):
+                                chat_handler_obj.extra_template_arguments["enable_thinking"] = think_mode
             else:
-                cls.chat_handler = handler(clip_model_path=mmproj_path, verbose=False)
+                chat_handler_obj = handler(clip_model_path=mmproj_path, verbose=False)
         else:
             if vram_limit != -1:
                 n_gpu_layers = max(1, int(vram_limit / gguf_layer_size))
             if handler is not None:
-                cls.chat_handler = handler(verbose=False)
+                chat_handler_obj = handler(verbose=False)
         
         print(f"[llama-cpp_vlm] Loading model: {model}")
         print(f"[llama-cpp_vlm] n_gpu_layers = {n_gpu_layers}")
-        cls.llm = Llama(model_path, chat_handler=cls.chat_handler, n_gpu_layers=n_gpu_layers, n_ctx=n_ctx, verbose=False)
+        thread_args = {} if n_threads is None else {"n_threads": n_threads, "n_threads_batch": n_threads}
+        llm = Llama(model_path, chat_handler=chat_handler_obj, n_gpu_layers=n_gpu_layers, n_ctx=n_ctx, verbose=False, **thread_args)
+        LLAMA_CPP_PREFIX_CACHE.install(llm, cls.config_key(config))
+        return llm, chat_handler_obj
 
 any_type = AnyType("*")
 
@@ -245,32 +588,41 @@ def parse_json(json_str):
     return parsed
 
 def scale_image(image: torch.Tensor, max_size: int = 128):
-    resized_frames = []
-    img_np = np.clip(255.0 * image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8)
-    img_pil = Image.fromarray(img_np)
-    w, h = img_pil.size
+    # 🔹 在张量原来的设备和精度上缩放，只在编码 JPEG 时量化一次为 uint8
+    img = image.squeeze()
+    h, w = img.shape[0], img.shape[1]
     scale = min(max_size / max(w, h), 1.0)
     new_w, new_h = int(w * scale), int(h * scale)
-    img_resized = img_pil.resize((new_w, new_h), Image.Resampling.LANCZOS)
-    return np.array(img_resized)
+    if (new_w, new_h) != (w, h):
+        src = img.permute(2, 0, 1).unsqueeze(0)
+        src = src if src.dtype in (torch.float32, torch.float64) else src.float()
+        img = torch.nn.functional.interpolate(src, size=(new_h, new_w), mode="bicubic", align_corners=False, antialias=True)[0].permute(1, 2, 0)
+    return (img.clamp(0, 1) * 255.0).round().to(torch.uint8).cpu().numpy()
 
 def qwen3bbox(image, json):
-    img = Image.fromarray(np.clip(255.0 * image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8))
+    # 🔹 这里只需要图片尺寸，直接从张量形状读取，不再构造 PIL 图片
+    height, width = image.shape[-3], image.shape[-2]
     bboxes = []
     for item in json:
         x0, y0, x1, y1 = item["bbox_2d"]
         size = 1000
-        x0 = x0 / size * img.width
-        y0 = y0 / size * img.height
-        x1 = x1 / size * img.width
-        y1 = y1 / size * img.height
+        x0 = x0 / size * width
+        y0 = y0 / size * height
+        x1 = x1 / size * width
+        y1 = y1 / size * height
         bboxes.append((x0, y0, x1, y1))
     return bboxes
 
 def draw_bbox(image, json, mode):
+    # 🔹 框和标签画在 8 位的覆盖层上，再合成回原张量，
+    # 没画到的像素保持原来的精度和设备
     label_colors = {}
-    img = Image.fromarray(np.clip(255.0 * image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8))
-    draw = ImageDraw.Draw(img)
+    img = image.squeeze()
+    height, width = img.shape[0], img.shape[1]
+    overlay = Image.new("RGB", (width, height))
+    coverage = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(overlay)
+    draw_mask = ImageDraw.Draw(coverage)
     for item in json:
         try:
             label = item["label"]
@@ -283,21 +635,26 @@ def draw_bbox(image, json, mode):
         # 🔹 修改：添加 Qwen3.5-VL 到坐标缩放判断
         if mode in ["Qwen3-VL", "Qwen2.5-VL", "Qwen3.5-VL"]:
             size = 1000
-            x0 = x0 / size * img.width
-            y0 = y0 / size * img.height
-            x1 = x1 / size * img.width
-            y1 = y1 / size * img.height
+            x0 = x0 / size * width
+            y0 = y0 / size * height
+            x1 = x1 / size * width
+            y1 = y1 / size * height
         bbox = (x0, y0, x1, y1)
         
         if label not in label_colors:
             label_colors[label] = tuple(random.randint(80, 180) for _ in range(3))
         color = label_colors[label]
         draw.rectangle(bbox, outline=color, width=4)
+        draw_mask.rectangle(bbox, outline=255, width=4)
         text_y = max(0, y0 - 10)
         text_size = draw.textbbox((x0, text_y), label)
-        draw.rectangle([text_size[0], text_size[1]-2, text_size[2]+4, text_size[3]+2], fill=color)
+        label_box = [text_size[0], text_size[1]-2, text_size[2]+4, text_size[3]+2]
+        draw.rectangle(label_box, fill=color)
+        draw_mask.rectangle(label_box, fill=255)
         draw.text((x0+2, text_y), label, fill=(255,255,255))
-    return torch.from_numpy(np.array(img).astype(np.float32) / 255.0).unsqueeze(0)
+    overlay_t = torch.from_numpy(np.array(overlay)).to(device=img.device, dtype=img.dtype) / 255.0
+    coverage_t = torch.from_numpy(np.array(coverage) > 0).to(img.device).unsqueeze(-1)
+    return torch.where(coverage_t, overlay_t, img[..., :3]).unsqueeze(0)
 
 class llama_cpp_model_loader:
     @classmethod
@@ -321,6 +678,13 @@ class llama_cpp_model_loader:
             }),
             "image_min_tokens": ("INT", {"default": 0, "min": 0, "max": 4096, "step": 32}),
             "image_max_tokens": ("INT", {"default": 0, "min": 0, "max": 4096, "step": 32}),
+        },
+        "optional": {
+            "pool_budget_gb": ("FLOAT", {
+                "default": LLAMA_CPP_STORAGE.pool_budget_gb,
+                "min": 0.0, "max": 1024.0, "step": 0.5,
+                "tooltip": "Memory budget (GB) for keeping several models loaded at once.\nThe least recently used model is unloaded when the budget is exceeded.\n0 = keep only one model."
+            }),
         }}
 
     RETURN_TYPES = ("LLAMACPPMODEL",)
@@ -329,9 +693,7 @@ class llama_cpp_model_loader:
     CATEGORY = "llama-cpp-vlm"
 
     @classmethod
-    def IS_CHANGED(s, model, mmproj, chat_handler, n_ctx, vram_limit, image_min_tokens, image_max_tokens):
-        if LLAMA_CPP_STORAGE.llm is None:
-            return float("NaN")
+    def IS_CHANGED(s, model, mmproj, chat_handler, n_ctx, vram_limit, image_min_tokens, image_max_tokens, pool_budget_gb=None):
         custom_config = {
             "model": model,
             "mmproj": mmproj,
@@ -341,10 +703,12 @@ class llama_cpp_model_loader:
             "image_min_tokens": image_min_tokens,
             "image_max_tokens": image_max_tokens
         }
-        config_str = json.dumps(custom_config, sort_keys=True, ensure_ascii=False)
+        config_str = LLAMA_CPP_STORAGE.config_key(custom_config)
+        if config_str not in LLAMA_CPP_STORAGE.pool:
+            return float("NaN")
         return config_str
 
-    def loadmodel(self, model, mmproj, chat_handler, n_ctx, vram_limit, image_min_tokens, image_max_tokens):
+    def loadmodel(self, model, mmproj, chat_handler, n_ctx, vram_limit, image_min_tokens, image_max_tokens, pool_budget_gb=None):
         custom_config = {
             "model": model,
             "mmproj": mmproj,
@@ -354,10 +718,12 @@ class llama_cpp_model_loader:
             "image_min_tokens": image_min_tokens,
             "image_max_tokens": image_max_tokens
         }
-        if not LLAMA_CPP_STORAGE.llm or LLAMA_CPP_STORAGE.current_config != custom_config:
+        if pool_budget_gb is not None:
+            LLAMA_CPP_STORAGE.pool_budget_gb = pool_budget_gb
+        if LLAMA_CPP_STORAGE.config_key(custom_config) not in LLAMA_CPP_STORAGE.pool:
             print("[llama-cpp_vlm] Loading model...")
-            LLAMA_CPP_STORAGE.load_model(custom_config)
-        return (LLAMA_CPP_STORAGE,)
+        LLAMA_CPP_STORAGE.acquire(custom_config)
+        return (LLAMA_CPP_HANDLE(custom_config),)
 
 class llama_cpp_instruct_adv:
     @classmethod
@@ -403,6 +769,14 @@ class llama_cpp_instruct_adv:
                 "parameters": ("LLAMACPPARAMS",),
                 "images": ("IMAGE",),
                 "queue_handler": (any_type, {"tooltip": "Used to control the execution order of instruct nodes."}),
+                "prefix_cache": (["off", "ram", "ram+disk"], {
+                    "default": "off",
+                    "tooltip": "Cache the llama.cpp state after the text that comes before the first image\n(system + preset prompt), so each image starts from that snapshot instead of re-evaluating the prompt.\nOnly used for image inputs. ram+disk also keeps snapshots on disk across restarts."
+                }),
+                "parallel": ("INT", {
+                    "default": 1, "min": 1, "max": 64, "step": 1,
+                    "tooltip": 'Number of images decoded concurrently in "one by one" mode.\nRuns on dedicated model instances that share the mmap\'d weights and split the CPU threads;\non GPU every instance needs its own VRAM copy. Their estimated size counts toward pool_budget_gb.'
+                }),
             },
         }
 
@@ -422,7 +796,46 @@ class llama_cpp_instruct_adv:
                         item["image_url"]["url"] = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAACXBIWXMAAAsTAAALEwEAmpwYAAAADElEQVQImWP4//8/AAX+Av5Y8msOAAAAAElFTkSuQmCC"
         return clean_messages
 
-    def process(self, llama_model, preset_prompt, custom_prompt, system_prompt, inference_mode, max_frames, max_size, seed, force_offload, save_states, unique_id, parameters=None, images=None, queue_handler=None):
+    def process_parallel(self, llama_model, messages, frames, parallel, seed, parameters, prefix_cache="off"):
+        """
+        🔹 "one by one" 的并行版本：每张图片构造独立的 messages 副本，交给空闲的模型实例推理，
+        输出顺序与输入一致。返回 (各图片的文本, 最后一张图片的 data url)，data url 在保存会话状态时使用
+        实例按设置的 parallel 取用（线程划分不随本次图片数变化），图片少于 parallel 时只用其中几个，不重新加载
+        """
+        workers = queue.Queue()
+        for llm in LLAMA_CPP_STORAGE.get_workers(llama_model.config, parallel):
+            workers.put(llm)
+        parallel = min(parallel, len(frames))
+        history, user_message = messages[:-1], messages[-1]
+        
+        def run(image):
+            if mm.processing_interrupted():
+                raise mm.InterruptProcessingException()
+            data = image2base64(np.clip(255.0 * image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8))
+            url = f"data:image/jpeg;base64,{data}"
+            content = [{"type": "image_url", "image_url": {"url": url}} if item.get("type") == "image_url" else item
+                       for item in user_message["content"]]
+            llm = workers.get()
+            try:
+                output = LLAMA_CPP_PREFIX_CACHE.chat_completion(
+                    llm, prefix_cache, messages=history + [{"role": "user", "content": content}], seed=seed, **parameters
+                )
+            finally:
+                workers.put(llm)
+            return output['choices'][0]['message']['content'].removeprefix(": ").lstrip(), url
+        
+        print(f"[llama-cpp_vlm] Parallel inference with {parallel} workers")
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            futures = [executor.submit(run, image) for image in frames]
+            try:
+                results = [future.result() for future in cqdm(futures)]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return [text for text, _ in results], results[-1][1]
+
+    def process(self, llama_model, preset_prompt, custom_prompt, system_prompt, inference_mode, max_frames, max_size, seed, force_offload, save_states, unique_id, parameters=None, images=None, queue_handler=None, parallel=1, prefix_cache="off"):
         if not llama_model.llm:
             raise RuntimeError("The model has been unloaded or failed to load!")
         
@@ -493,6 +906,15 @@ class llama_cpp_instruct_adv:
                 messages.append({"role": "user", "content": user_content})
                 print(f"[llama-cpp_vlm] Start processing {len(frames)} images")
                 
+                if parallel > 1 and len(frames) > 1 and hasattr(llama_model, "config"):
+                    texts, last_url = self.process_parallel(llama_model, messages, frames, parallel, seed, _parameters, prefix_cache)
+                    image_content["image_url"]["url"] = last_url
+                    for i, text in enumerate(texts):
+                        out2.append(text)
+                        tmp_list.append(f"====== Image {i+1} ======")
+                        tmp_list.append(text)
+                    frames = []
+                
                 for i, image in enumerate(cqdm(frames)):
                     if mm.processing_interrupted():
                         raise mm.InterruptProcessingException()
@@ -501,7 +923,7 @@ class llama_cpp_instruct_adv:
                         if item.get("type") == "image_url":
                             item["image_url"]["url"] = f"data:image/jpeg;base64,{data}"
                             break
-                    output = llama_model.llm.create_chat_completion(messages=messages, seed=seed, **_parameters)
+                    output = LLAMA_CPP_PREFIX_CACHE.chat_completion(llama_model.llm, prefix_cache, messages=messages, seed=seed, **_parameters)
                     text = output['choices'][0]['message']['content'].removeprefix(": ").lstrip()
                     out2.append(text)
                     if len(frames) > 1:
@@ -522,7 +944,7 @@ class llama_cpp_instruct_adv:
                     user_content.append(image_content)
                     
                 messages.append({"role": "user", "content": user_content})
-                output = llama_model.llm.create_chat_completion(messages=messages, seed=seed, **_parameters)
+                output = LLAMA_CPP_PREFIX_CACHE.chat_completion(llama_model.llm, prefix_cache, messages=messages, seed=seed, **_parameters)
                 out1 = output['choices'][0]['message']['content'].removeprefix(": ").lstrip()
                 out2 = [out1]
         else:
@@ -770,22 +1192,27 @@ class bbox_to_segs:
                 local_mask_np = gaussian_filter(local_mask_np, sigma=feather)
                 
             cropped_mask_np = local_mask_np
-            cropped_img_padded = torch.zeros((crop_h, crop_w, 3), dtype=image.dtype, device=image.device)
-            
+
             src_x_start = max(0, x1_exp)
             src_y_start = max(0, y1_exp)
             src_x_end = min(width, x2_exp)
             src_y_end = min(height, y2_exp)
-            
-            dst_x_start = src_x_start - x1_exp
-            dst_y_start = src_y_start - y1_exp
-            dst_x_end = src_x_end - x1_exp
-            dst_y_end = src_y_end - y1_exp
-            
-            if src_x_end > src_x_start and src_y_end > src_y_start:
-                source_crop = image_for_cropping[src_y_start:src_y_end, src_x_start:src_x_end, :]
-                cropped_img_padded[dst_y_start:dst_y_end, dst_x_start:dst_x_end, :] = source_crop
-                
+
+            if (src_x_start, src_y_start, src_x_end, src_y_end) == (x1_exp, y1_exp, x2_exp, y2_exp):
+                # 扩展后的区域完全在图片内：直接切片为视图，不需要新建画布
+                cropped_img_padded = image_for_cropping[y1_exp:y2_exp, x1_exp:x2_exp, :3]
+            else:
+                cropped_img_padded = torch.zeros((crop_h, crop_w, 3), dtype=image.dtype, device=image.device)
+
+                dst_x_start = src_x_start - x1_exp
+                dst_y_start = src_y_start - y1_exp
+                dst_x_end = src_x_end - x1_exp
+                dst_y_end = src_y_end - y1_exp
+
+                if src_x_end > src_x_start and src_y_end > src_y_start:
+                    source_crop = image_for_cropping[src_y_start:src_y_end, src_x_start:src_x_end, :3]
+                    cropped_img_padded[dst_y_start:dst_y_end, dst_x_start:dst_x_end, :] = source_crop
+
             cropped_image_tensor = cropped_img_padded.permute(2, 0, 1).unsqueeze(0)
             
             seg = SEG(
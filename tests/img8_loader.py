@@ -0,0 +1,19 @@
+# 测试用的模块加载：不执行包的 __init__.py（它会加载全部节点，需要 ComfyUI 环境），
+# 而是把仓库目录注册成一个空包，再按名字导入其中的模块，模块之间的相对导入照常可用
+import importlib
+import os
+import sys
+import types
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "img8_under_test"
+
+if PACKAGE not in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [REPO_DIR]
+    sys.modules[PACKAGE] = package
+
+
+def load(name):
+    """导入仓库中的模块，如 load("_img8plan")、load("img8x")"""
+    return importlib.import_module(f"{PACKAGE}.{name}")
@@ -0,0 +1,126 @@
+# _img8archive 的成员查找：zip / tar 中的成员名统一后都能按 "归档::成员" 找到并读取；
+# tar 的成员索引持久保存，归档变化后重建
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from img8_loader import load
+
+img8archive = load("_img8archive")
+img8cache = load("_img8cache")
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # 归档索引写到临时目录，不碰用户目录
+        patcher = mock.patch.object(img8cache, "index_path", return_value=os.path.join(self.tmp.name, "index.json"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+        self.archives = img8archive.ArchiveIndex()
+        patcher = mock.patch.object(img8archive, "ARCHIVES", self.archives)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+
+class ZipMemberTest(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.zip_path = self.path("data.zip")
+        with zipfile.ZipFile(self.zip_path, "w") as zf:
+            zf.writestr("./images/a.png", b"a")
+            zf.writestr("images\\b.png", b"b")
+            zf.writestr("/c.png", b"c")
+            zf.writestr("images/sub/", b"")
+
+    def tearDown(self):
+        for entry in self.archives.zips.values():
+            entry[1].close()
+
+    def test_unnormalized_names_are_found(self):
+        for member, data in (("images/a.png", b"a"), ("images/b.png", b"b"), ("c.png", b"c")):
+            path = img8archive.join_path(self.zip_path, member)
+            self.assertTrue(img8archive.exists(path), member)
+            self.assertEqual(img8archive.read_bytes(path), data)
+
+    def test_lookup_uses_split_path_normalization(self):
+        self.assertEqual(img8archive.read_bytes(f"{self.zip_path}::./images\\b.png"), b"b")
+        self.assertFalse(img8archive.exists(f"{self.zip_path}::images/missing.png"))
+        with self.assertRaises(FileNotFoundError):
+            img8archive.read_bytes(f"{self.zip_path}::images/missing.png")
+
+    def test_listing_skips_directories(self):
+        self.assertEqual(sorted(self.archives.members(self.zip_path)), ["c.png", "images/a.png", "images/b.png"])
+        self.assertEqual(img8archive.list_paths(f"{self.zip_path}::images"),
+                         [img8archive.join_path(self.zip_path, "images/a.png"),
+                          img8archive.join_path(self.zip_path, "images/b.png")])
+
+
+class TarMemberTest(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tar_path = self.path("data.tar")
+        self.write_tar({"./images/a.png": b"a" * 700, "images/b.png": b"b", "notes.txt": b"n"})
+
+    def write_tar(self, members):
+        with tarfile.open(self.tar_path, "w") as tar:
+            directory = tarfile.TarInfo("images")
+            directory.type = tarfile.DIRTYPE
+            tar.addfile(directory)
+            for name, data in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+    def test_members_are_read_by_offset(self):
+        self.assertEqual(img8archive.read_bytes(f"{self.tar_path}::images/a.png"), b"a" * 700)
+        self.assertEqual(img8archive.read_bytes(f"{self.tar_path}::./images/b.png"), b"b")
+        self.assertTrue(img8archive.exists(f"{self.tar_path}::notes.txt"))
+        self.assertFalse(img8archive.exists(f"{self.tar_path}::images"))
+        with self.assertRaises(FileNotFoundError):
+            img8archive.read_bytes(f"{self.tar_path}::missing.png")
+
+    def test_index_is_reused_until_archive_changes(self):
+        self.archives.read(self.tar_path, "images/b.png")
+        self.assertTrue(os.path.isfile(img8archive.index_file(self.tar_path)))
+        # 新的 ArchiveIndex 直接读取持久索引，不再扫描 tar
+        fresh = img8archive.ArchiveIndex()
+        with mock.patch.object(tarfile, "open", side_effect=AssertionError("rescanned")):
+            self.assertEqual(fresh.read(self.tar_path, "images/b.png"), b"b")
+
+        self.write_tar({"images/b.png": b"new b" * 300})
+        os.utime(self.tar_path, ns=(1_000_000_000, 1_000_000_000))
+        self.assertEqual(fresh.read(self.tar_path, "images/b.png"), b"new b" * 300)
+        self.assertFalse(fresh.contains(self.tar_path, "images/a.png"))
+
+    def test_list_paths(self):
+        member = lambda name: img8archive.join_path(self.tar_path, name)
+        self.assertEqual(img8archive.list_paths(self.tar_path),
+                         [member("images/a.png"), member("images/b.png"), member("notes.txt")])
+        self.assertEqual(img8archive.list_paths(f"{self.tar_path}::images/"),
+                         [member("images/a.png"), member("images/b.png")])
+        self.assertEqual(img8archive.list_paths(f"{self.tar_path}::*.txt"), [member("notes.txt")])
+        self.assertEqual(img8archive.list_paths(f"{self.tar_path}::images/b.png"), [member("images/b.png")])
+        with self.assertRaises(FileNotFoundError):
+            img8archive.list_paths(self.path("missing.tar"))
+
+    def test_split_path(self):
+        self.assertEqual(img8archive.split_path(f"{self.tar_path}::\\images\\a.png"),
+                         (os.path.abspath(self.tar_path), "images/a.png"))
+        # 不是归档扩展名时按普通路径处理
+        self.assertEqual(img8archive.split_path("C::images/a.png"), (None, "C::images/a.png"))
+        self.assertEqual(img8archive.split_path(self.tar_path), (None, self.tar_path))
+        self.assertEqual(img8archive.sidecar_dir(f"{self.tar_path}::images/../a.png"),
+                         os.path.join(self.path("data_captions"), "images"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# _img8cache 的文件指纹索引和按字节预算淘汰的 LRU 缓存，以及 _img8presets 的用户预设重新载入
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from img8_loader import load
+
+img8cache = load("_img8cache")
+img8presets = load("_img8presets")
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_byte_budget_evicts_least_recently_used(self):
+        cache = img8cache.LRUCache(10, sizeof=len)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        self.assertEqual(cache.get("a"), b"aaaa")  # a 变为最近使用
+        cache.put("c", b"cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (b"aaaa", b"cccc"))
+        self.assertEqual(cache.stats(), {"entries": 2, "bytes": 8, "max_bytes": 10,
+                                         "hits": 3, "misses": 1, "evictions": 1})
+
+    def test_oversized_value_is_not_cached(self):
+        cache = img8cache.LRUCache(10, sizeof=len)
+        cache.put("a", b"aaaa")
+        cache.put("a", b"x" * 11)  # 替换为超出预算的值时旧值也被移除
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.bytes, 0)
+
+
+class FingerprintIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index_file = os.path.join(self.tmp.name, "index.json")
+        self.files = []
+        for i in range(3):
+            path = os.path.join(self.tmp.name, f"{i}.png")
+            with open(path, "wb") as f:
+                f.write(bytes([i]) * 100)
+            self.files.append(path)
+
+    def test_unchanged_files_are_not_rehashed(self):
+        index = img8cache.FingerprintIndex(self.index_file)
+        with mock.patch.object(img8cache, "hash_file", wraps=img8cache.hash_file) as hash_file:
+            digest = index.fingerprint(self.files[0])
+            self.assertEqual(index.fingerprint(self.files[0]), digest)
+            self.assertEqual(hash_file.call_count, 1)
+            with open(self.files[0], "ab") as f:
+                f.write(b"more")
+            self.assertNotEqual(index.fingerprint(self.files[0]), digest)
+            self.assertEqual(hash_file.call_count, 2)
+        with open(self.files[0], "rb") as f:
+            self.assertEqual(index.fingerprint(self.files[0]), hashlib.sha256(f.read()).hexdigest())
+
+    def test_persisted_and_reloaded(self):
+        index = img8cache.FingerprintIndex(self.index_file)
+        digests = [index.fingerprint(path) for path in self.files]
+        index.flush()
+        reloaded = img8cache.FingerprintIndex(self.index_file)
+        with mock.patch.object(img8cache, "hash_file") as hash_file:
+            self.assertEqual([reloaded.fingerprint(path) for path in self.files], digests)
+        hash_file.assert_not_called()
+
+    def test_entry_limit_drops_least_recently_used(self):
+        index = img8cache.FingerprintIndex(self.index_file)
+        with mock.patch.object(img8cache, "MAX_ENTRIES", 2):
+            index.fingerprint(self.files[0])
+            index.fingerprint(self.files[1])
+            index.fingerprint(self.files[0])  # 0 变为最近使用
+            index.fingerprint(self.files[2])
+        self.assertEqual(list(index.entries), [os.path.abspath(self.files[0]), os.path.abspath(self.files[2])])
+
+
+class PresetReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.user_file = os.path.join(self.tmp.name, "img8presets.json")
+        patcher = mock.patch.dict(os.environ, {"IMG8_PRESETS": self.user_file})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = img8presets.PresetRegistry()
+
+    def write(self, data, mtime_ns):
+        with open(self.user_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.utime(self.user_file, ns=(mtime_ns, mtime_ns))
+
+    def test_user_file_is_reloaded_when_modified(self):
+        builtin = self.registry.get("flux", self.registry.default("flux"))
+        self.write({"flux": {"presets": [{"label": builtin.label, "width": 64, "height": 32}]},
+                    "custom": {"presets": [{"label": "tiny", "width": 16, "height": 16}]}}, 1_000_000_000)
+        override = self.registry.get("flux", builtin.label)
+        self.assertEqual((override.width, override.height, override.ratio), (64, 32, "2:1"))
+        self.assertEqual(self.registry.lookup("custom/tiny").height, 16)
+
+        self.write({"custom": {"presets": [{"label": "tiny", "width": 32, "height": 32}]}}, 2_000_000_000)
+        self.assertEqual(self.registry.lookup("custom/tiny").width, 32)
+        self.assertEqual(self.registry.get("flux", builtin.label), builtin)
+
+        # 文件有误时只用内置预设
+        with open(self.user_file, "w", encoding="utf-8") as f:
+            f.write("{broken")
+        os.utime(self.user_file, ns=(3_000_000_000, 3_000_000_000))
+        self.assertIsNone(self.registry.lookup("custom/tiny"))
+
+        os.remove(self.user_file)
+        self.assertEqual(self.registry.get("flux", builtin.label), builtin)
+
+
+if __name__ == "__main__":
+    unittest.main()
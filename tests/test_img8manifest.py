@@ -0,0 +1,113 @@
+# _img8manifest 的跳过逻辑：pending() 按 (路径, 模型键, 提示词键) 和内容指纹判断；
+# img8txtsaver 的后台写入线程写完文本后才记入清单
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from img8_loader import load
+
+img8cache = load("_img8cache")
+img8manifest = load("_img8manifest")
+img8txtsaver = load("img8txtsaver")
+
+
+class ManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # 指纹索引和清单都放在临时目录，不碰用户目录
+        for target, attribute, value in (
+            (img8cache, "index_path", mock.Mock(return_value=self.path("img8_fingerprints.json"))),
+            (img8cache, "FINGERPRINTS", img8cache.FingerprintIndex(self.path("img8_fingerprints.json"))),
+        ):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.images = [self.write(f"{name}.png", name.encode()) for name in ("a", "b", "c")]
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def write(self, name, data):
+        path = self.path(name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def manifest(self):
+        book = img8manifest.Manifest(self.path("captions.sqlite"))
+        self.addCleanup(lambda: book.conn and book.conn.close())
+        return book
+
+
+class KeyTest(unittest.TestCase):
+    def test_prompt_key(self):
+        self.assertEqual(img8manifest.prompt_key("", ""), "")
+        self.assertEqual(img8manifest.prompt_key(" describe "), img8manifest.prompt_key("describe"))
+        self.assertEqual(img8manifest.prompt_key("describe", " "), img8manifest.prompt_key("describe"))
+        self.assertNotEqual(img8manifest.prompt_key("describe", "be brief"), img8manifest.prompt_key("describe"))
+        self.assertNotEqual(img8manifest.prompt_key("a", "b"), img8manifest.prompt_key("b", "a"))
+
+    def test_model_key(self):
+        config = {"model": "qwen.gguf", "mmproj": "mmproj.gguf", "n_ctx": 8192}
+        reordered = dict(reversed(list(config.items())))
+        self.assertEqual(img8manifest.model_key(config), img8manifest.model_key(reordered))
+        self.assertEqual(img8manifest.model_key(mock.Mock(config=config)), img8manifest.model_key(config))
+        self.assertNotEqual(img8manifest.model_key(dict(config, n_ctx=4096)), img8manifest.model_key(config))
+        self.assertEqual(img8manifest.model_key(None), "")
+
+
+class PendingTest(ManifestTestCase):
+    def test_pending_keys(self):
+        book = self.manifest()
+        a, b, c = self.images
+        book.record([(a, img8manifest.content_key(a), "m", "p", "caption a")])
+        self.assertEqual(book.pending(self.images, "m", "p"), [b, c])
+        self.assertEqual(book.lookup(a, "m", "p")[1], "caption a")
+        # 换了模型或提示词，已有的记录都不匹配
+        self.assertEqual(book.pending(self.images, "other", "p"), self.images)
+        self.assertEqual(book.pending(self.images, "m", "other"), self.images)
+
+    def test_changed_content_is_pending_again(self):
+        book = self.manifest()
+        a = self.images[0]
+        book.record([(a, img8manifest.content_key(a), "m", "p", "caption a")])
+        self.write("a.png", b"changed")
+        self.assertEqual(book.pending([a], "m", "p"), [a])
+
+    def test_unrecorded_paths_are_not_hashed(self):
+        book = self.manifest()
+        with mock.patch.object(img8manifest, "content_key") as content_key:
+            self.assertEqual(book.pending(self.images, "m", "p"), self.images)
+        content_key.assert_not_called()
+
+    def test_open_manifest_shares_instances(self):
+        self.assertIsNone(img8manifest.open_manifest("  "))
+        book = img8manifest.open_manifest(self.path("shared.sqlite"))
+        self.assertIs(img8manifest.open_manifest(f'"{self.path("shared.sqlite")}"'), book)
+        self.assertEqual(img8manifest.manifest_path("relative.sqlite"), self.path("relative.sqlite"))
+
+
+class CaptionWriterTest(ManifestTestCase):
+    def test_saved_captions_are_recorded(self):
+        book = self.manifest()
+        node = img8txtsaver.Img8TxtSaver()
+        with mock.patch.object(img8manifest, "open_manifest", return_value=book):
+            node.save_text([" caption a ", "caption b", ""], self.images, ["disabled"], ["captions.sqlite"],
+                           [{"model": "m"}], ["describe"])
+        img8txtsaver.WRITER.flush()
+
+        a, b, c = self.images
+        with open(self.path("a.txt"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "caption a")
+        self.assertTrue(os.path.exists(self.path("b.txt")))
+        # 空文本不保存，也不记入清单
+        self.assertFalse(os.path.exists(self.path("c.txt")))
+        self.assertEqual([name for name in os.listdir(self.tmp.name) if name.endswith(".tmp")], [])
+        keys = (img8manifest.model_key({"model": "m"}), img8manifest.prompt_key("describe"))
+        self.assertEqual(book.pending(self.images, *keys), [c])
+
+
+if __name__ == "__main__":
+    unittest.main()
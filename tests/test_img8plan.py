@@ -0,0 +1,80 @@
+# _img8plan 的尺寸规划：查表加二分的结果与穷举一致，覆盖预算不足、极端宽高比和失真相同时取大面积
+import itertools
+import math
+import unittest
+
+from img8_loader import load
+
+img8plan = load("_img8plan")
+
+
+def brute_force(aspect, multiple, max_pixels):
+    """穷举所有"最大"的对齐尺寸（再加宽或加高一个倍数都超出预算），按 (对数失真, -面积) 取最优"""
+    units = max_pixels // (multiple * multiple)
+    sizes = [(kw * multiple, kh * multiple) for kw in range(1, units + 1) for kh in range(1, units // kw + 1)
+             if (kw + 1) * kh > units and kw * (kh + 1) > units]
+    return min(sizes, key=lambda size: (abs(math.log(size[0] / size[1] / aspect)), -size[0] * size[1]))
+
+
+class SizeTableTest(unittest.TestCase):
+    def test_entries_are_aligned_maximal_and_sorted(self):
+        for multiple, max_pixels in ((8, 512 * 512), (16, 1024 * 1024), (64, 1920 * 1080), (32, 5000)):
+            aspects, sizes = img8plan.size_table(multiple, max_pixels)
+            self.assertEqual(list(aspects), sorted(aspects))
+            self.assertEqual(len(set(aspects)), len(aspects))
+            for aspect, (width, height) in zip(aspects, sizes):
+                self.assertEqual((width % multiple, height % multiple), (0, 0))
+                self.assertLessEqual(width * height, max_pixels)
+                # 再加宽或加高一个倍数都会超出预算
+                self.assertGreater((width + multiple) * height, max_pixels)
+                self.assertGreater(width * (height + multiple), max_pixels)
+                self.assertAlmostEqual(aspect, width / height)
+                self.assertLessEqual(max(aspect, 1 / aspect), img8plan.ASPECT_LIMIT + 1e-9)
+
+    def test_budget_below_one_block(self):
+        self.assertEqual(img8plan.size_table(64, 64 * 64 - 1), ((1.0,), ((64, 64),)))
+        for aspect in (0.01, 1.0, 100.0):
+            self.assertEqual(img8plan.plan_size(aspect, 64, 1000), (64, 64))
+
+    def test_single_block_budget(self):
+        self.assertEqual(img8plan.plan_size(3.0, 64, 64 * 64), (64, 64))
+
+
+class PlanSizeTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        aspects = [1.0, 4 / 3, 3 / 4, 16 / 9, 9 / 16, 2.35, 0.5, 3.0, 1 / 7, 7.0, 1.001]
+        for (multiple, max_pixels), aspect in itertools.product(
+                ((8, 256 * 256), (16, 512 * 512), (64, 1024 * 1024), (32, 100 * 100), (8, 1000)), aspects):
+            with self.subTest(multiple=multiple, max_pixels=max_pixels, aspect=aspect):
+                self.assertEqual(img8plan.plan_size(aspect, multiple, max_pixels),
+                                 brute_force(aspect, multiple, max_pixels))
+
+    def test_exact_table_aspects(self):
+        aspects, sizes = img8plan.size_table(16, 512 * 512)
+        for aspect, size in zip(aspects, sizes):
+            self.assertEqual(img8plan.plan_size(aspect, 16, 512 * 512), size)
+
+    def test_extreme_aspects_clamp_to_table_ends(self):
+        aspects, sizes = img8plan.size_table(16, 1024 * 1024)
+        self.assertEqual(img8plan.plan_size(1000.0, 16, 1024 * 1024), sizes[-1])
+        self.assertEqual(img8plan.plan_size(1 / 1000, 16, 1024 * 1024), sizes[0])
+
+    def test_equal_distortion_prefers_larger_area(self):
+        # 两个相邻表项的几何平均处失真相同，取面积更大的一个
+        aspects, sizes = img8plan.size_table(16, 512 * 512)
+        for i in range(len(aspects) - 1):
+            mid = math.sqrt(aspects[i] * aspects[i + 1])
+            width, height = img8plan.plan_size(mid, 16, 512 * 512)
+            best = max(sizes[i], sizes[i + 1], key=lambda size: size[0] * size[1])
+            self.assertLessEqual(abs(math.log(width / height / mid)),
+                                 abs(math.log(best[0] / best[1] / mid)) + 1e-12)
+            self.assertGreaterEqual(width * height, min(s[0] * s[1] for s in (sizes[i], sizes[i + 1])))
+
+    def test_align_helpers(self):
+        self.assertEqual([img8plan.align_up(v, 8) for v in (0, 1, 8, 9)], [0, 8, 8, 16])
+        # 正好一半时向下
+        self.assertEqual([img8plan.align_nearest(v, 8) for v in (3, 4, 5, 12, 13)], [0, 0, 8, 8, 16])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# _img8resample 的批处理测试：GPU（非 CPU 设备）上多帧批次应整批做矩阵乘，而不是逐帧循环
+# 运行：python -m unittest discover -s tests（或 pytest tests）
+import os
+import unittest
+from unittest import mock
+
+import torch
+
+from img8_loader import load
+
+img8resample = load("_img8resample")
+
+
+def count_matmuls(x, height, width, fold, **kwargs):
+    """按指定的 fold_batch 结果缩放，返回 (输出, 稀疏矩阵乘次数, 是否走了逐帧循环)"""
+    with mock.patch.object(img8resample, "fold_batch", return_value=fold), \
+            mock.patch.object(torch.sparse, "mm", wraps=torch.sparse.mm) as mm, \
+            mock.patch.object(img8resample, "map_frames", wraps=img8resample.map_frames) as per_frame:
+        out = img8resample.resize(x, height, width, "lanczos", **kwargs)
+    return out, mm.call_count, per_frame.called
+
+
+class FoldBatchTest(unittest.TestCase):
+    def test_batch_is_not_a_per_frame_loop(self):
+        torch.manual_seed(0)
+        single = torch.rand(1, 96, 128, 3)
+        batch = torch.rand(6, 96, 128, 3)
+        _, single_calls, _ = count_matmuls(single, 40, 56, fold=True)
+        _, batch_calls, looped = count_matmuls(batch, 40, 56, fold=True)
+        self.assertFalse(looped)
+        # 每条输出行两次矩阵乘，与批大小无关
+        self.assertEqual(batch_calls, single_calls)
+        self.assertEqual(batch_calls, 2)
+
+    def test_folded_matches_per_frame(self):
+        torch.manual_seed(0)
+        for x, kwargs in (
+            (torch.rand(4, 97, 131, 3), {}),
+            (torch.rand(3, 300, 400, 3), {"max_bytes": 200000}),
+            (torch.rand(3, 50, 70), {"window": (5, 3, 20, 15)}),
+            (torch.rand(2, 64, 64, 3).half(), {}),
+        ):
+            folded, _, _ = count_matmuls(x, 33, 44, fold=True, **kwargs)
+            per_frame, _, looped = count_matmuls(x, 33, 44, fold=False, **kwargs)
+            self.assertTrue(looped)
+            self.assertEqual(folded.dtype, x.dtype)
+            self.assertTrue(torch.equal(folded, per_frame))
+
+    def test_fold_only_off_cpu(self):
+        self.assertFalse(img8resample.fold_batch("cpu"))
+        self.assertTrue(img8resample.fold_batch("cuda"))
+
+    @unittest.skipUnless(torch.cuda.is_available(), "需要 CUDA")
+    def test_cuda_batch_is_not_a_per_frame_loop(self):
+        x = torch.rand(8, 256, 256, 3, device="cuda")
+        with mock.patch.object(torch.sparse, "mm", wraps=torch.sparse.mm) as mm, \
+                mock.patch.object(img8resample, "map_frames", wraps=img8resample.map_frames) as per_frame:
+            out = img8resample.resize(x, 128, 128, "lanczos")
+        self.assertFalse(per_frame.called)
+        self.assertEqual(mm.call_count, 2)
+        reference = img8resample.resize(x.cpu(), 128, 128, "lanczos")
+        self.assertTrue(torch.allclose(out.cpu(), reference, atol=1e-5))
+
+
+
+class FrameWorkersTest(unittest.TestCase):
+    def test_env_override_falls_back_on_bad_values(self):
+        default = min(32, os.cpu_count() or 1)
+        for value, expected in (("", default), ("0", default), ("abc", default), ("-3", default), (" 3 ", 3)):
+            with mock.patch.dict(os.environ, {"IMG8_RESIZE_WORKERS": value}):
+                self.assertEqual(img8resample._resize_workers(), expected, value)
+
+    def test_pool_leaves_room_for_intra_op_threads(self):
+        with mock.patch.object(img8resample, "RESIZE_WORKERS", 32), \
+                mock.patch.object(img8resample.os, "cpu_count", return_value=16), \
+                mock.patch.object(torch, "get_num_threads", return_value=4):
+            self.assertEqual(img8resample.frame_workers(64, "cpu"), 4)
+            self.assertEqual(img8resample.frame_workers(2, "cpu"), 2)
+            self.assertEqual(img8resample.frame_workers(64, "cpu", intra_op=False), 32)
+            self.assertEqual(img8resample.frame_workers(64, "cuda"), 1)
+        with mock.patch.object(img8resample.os, "cpu_count", return_value=8), \
+                mock.patch.object(torch, "get_num_threads", return_value=8):
+            self.assertEqual(img8resample.frame_workers(64, "cpu"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
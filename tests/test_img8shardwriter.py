@@ -0,0 +1,102 @@
+# img8shardwriter：分片边界、.tar.tmp 改名、索引缺失或损坏时按已有分片重建
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+
+from img8_loader import load
+
+shardwriter = load("img8shardwriter")
+
+
+class ShardWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = os.path.join(self.tmp.name, "shards")
+        self.images = []
+        for i in range(5):
+            path = os.path.join(self.tmp.name, f"{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(bytes([i]) * 1000)
+            self.images.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sample_bytes(self, writer, image_path, key="000000000"):
+        meta = json.dumps({"key": key, "source": image_path, "image_bytes": 1000}, ensure_ascii=False)
+        return sum(shardwriter.member_bytes(n) for n in (1000, len("caption"), len(meta.encode("utf-8"))))
+
+    def write_all(self, writer, max_bytes):
+        return [writer.write(path, "caption", max_bytes) for path in self.images]
+
+    def index(self):
+        with open(os.path.join(self.out, "s-index.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_shard_boundary(self):
+        writer = shardwriter.ShardWriter(self.out, "s")
+        # 上限刚好放下两个样本
+        keys = self.write_all(writer, 2 * self.sample_bytes(writer, self.images[0]))
+        writer.close()
+        self.assertEqual(keys, [f"{i:09d}" for i in range(5)])
+        index = self.index()
+        self.assertEqual([shard["samples"] for shard in index["shards"]], [2, 2, 1])
+        self.assertEqual(index["samples"], 5)
+        self.assertEqual([(s["first_key"], s["last_key"]) for s in index["shards"]],
+                         [("000000000", "000000001"), ("000000002", "000000003"), ("000000004", "000000004")])
+        with tarfile.open(os.path.join(self.out, "s-000001.tar")) as tar:
+            self.assertEqual(tar.getnames(), ["000000002.jpg", "000000002.txt", "000000002.json",
+                                              "000000003.jpg", "000000003.txt", "000000003.json"])
+
+    def test_oversized_sample_gets_its_own_shard(self):
+        writer = shardwriter.ShardWriter(self.out, "s")
+        self.write_all(writer, 1)
+        writer.close()
+        self.assertEqual([shard["samples"] for shard in self.index()["shards"]], [1] * 5)
+
+    def test_open_shard_is_tmp_until_closed(self):
+        writer = shardwriter.ShardWriter(self.out, "s")
+        writer.write(self.images[0], "caption", 1 << 30)
+        self.assertEqual(os.listdir(self.out), ["s-000000.tar.tmp"])
+        writer.close()
+        self.assertEqual(sorted(os.listdir(self.out)), ["s-000000.tar", "s-index.json"])
+
+    def test_rebuild_missing_or_corrupt_index(self):
+        writer = shardwriter.ShardWriter(self.out, "s")
+        self.write_all(writer, 2 * self.sample_bytes(writer, self.images[0]))
+        writer.close()
+        expected = self.index()
+        index_path = os.path.join(self.out, "s-index.json")
+
+        for damage in ("missing", "corrupt", "stale"):
+            if damage == "missing":
+                os.remove(index_path)
+            elif damage == "corrupt":
+                with open(index_path, "w", encoding="utf-8") as f:
+                    f.write("{not json")
+            else:
+                # 最后一个分片改名后、写索引前被中断
+                stale = dict(expected, shards=expected["shards"][:2], samples=4)
+                with open(index_path, "w", encoding="utf-8") as f:
+                    json.dump(stale, f)
+            resumed = shardwriter.ShardWriter(self.out, "s")
+            self.assertEqual((resumed.next_key, resumed.next_shard), (5, 3), damage)
+            self.assertEqual(self.index()["shards"], expected["shards"], damage)
+
+        self.assertEqual(resumed.write(self.images[0], "caption", 1 << 30), "000000005")
+        resumed.close()
+        self.assertEqual(self.index()["samples"], 6)
+
+    def test_node_keeps_shard_open_across_runs(self):
+        node = shardwriter.Img8ShardWriter()
+        for path in self.images[:3]:
+            node.write_shards(["caption"], [path], [self.out], ["s"], [1024])
+        self.assertEqual(os.listdir(self.out), ["s-000000.tar.tmp"])
+        shardwriter.get_writer(self.out, "s").close()
+        self.assertEqual([shard["samples"] for shard in self.index()["shards"]], [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# img8x 的外扩遮罩：输出不能与 lru_cache 中的模板共享内存，同时仍是整批共享一帧的广播视图
+import unittest
+
+import torch
+
+from img8_loader import load
+
+img8x = load("img8x")
+
+
+def storage_ptr(tensor):
+    return tensor.untyped_storage().data_ptr()
+
+
+class MaskAliasingTest(unittest.TestCase):
+    def setUp(self):
+        img8x.outpaint_mask_template.cache_clear()
+        self.image = torch.rand(1, 50, 40, 3)
+
+    def expand(self, image, **kwargs):
+        return img8x.img8x().expand_image(image, 8, 1 << 20, 64, **kwargs)
+
+    def cached_template(self):
+        _, _, _, x, y = self.expand(self.image)
+        return img8x.outpaint_mask_template(64, 64, x, y, 40, 50, 8, torch.float32, self.image.device)
+
+    def test_masks_do_not_share_storage_with_template(self):
+        first = self.expand(self.image)
+        second = self.expand(self.image)
+        self.assertGreater(img8x.outpaint_mask_template.cache_info().hits, 0)
+        template = self.cached_template()
+        for mask in (first[1], second[1]):
+            self.assertNotEqual(storage_ptr(mask), storage_ptr(template))
+        self.assertNotEqual(storage_ptr(first[1]), storage_ptr(second[1]))
+
+    def test_in_place_edit_does_not_corrupt_cache(self):
+        expected = self.expand(self.image)[1].clone()
+        mask, processed = self.expand(self.image)[1:3]
+        mask.mul_(0)
+        processed.add_(1)
+        again = self.expand(self.image)
+        self.assertTrue(torch.equal(again[1], expected))
+        self.assertEqual(again[2].max().item(), 0.0)
+
+    def test_batch_masks_are_broadcast_views(self):
+        batch = torch.rand(5, 50, 40, 3)
+        _, mask, processed, _, _ = self.expand(batch)
+        self.assertEqual(tuple(mask.shape), (5, 64, 64))
+        self.assertEqual(mask.stride(0), 0)
+        self.assertEqual(processed.stride(0), 0)
+        _, _, processed, _, _ = self.expand(batch, mask_opt=torch.rand(1, 50, 40))
+        self.assertEqual(processed.stride(0), 0)
+
+    def test_bucket_masks_are_broadcast_views(self):
+        frames = [torch.rand(3, 50, 40, 3)]
+        _, masks, processed, _ = img8x.img8xBucket().expand_list(frames, [8], [1 << 20], [64])
+        template = self.cached_template()
+        self.assertEqual(masks[0].stride(0), 0)
+        self.assertEqual(processed[0].stride(0), 0)
+        self.assertNotEqual(storage_ptr(masks[0]), storage_ptr(template))
+
+
+if __name__ == "__main__":
+    unittest.main()